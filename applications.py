@@ -0,0 +1,165 @@
+import asyncio
+import csv
+import io
+import json
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+COLUMNS = ("id", "created", "user_id", "chat_id", "name", "phone", "phone_norm", "question")
+
+
+def normalize_phone(phone: str) -> str:
+    """Только цифры: «+7 (777) 123-45-67» -> «77771234567» (так же строится ссылка wa.me)."""
+    return re.sub(r'[^\d]', '', phone or "")
+
+
+class Filter(NamedTuple):
+    since: Optional[float] = None       # created >= since (unix time)
+    until: Optional[float] = None       # created < until
+    phone: Optional[str] = None         # нормализованный телефон, точное совпадение
+    user_id: Optional[int] = None
+    limit: Optional[int] = None
+
+    def where(self):
+        clauses, params = [], []
+        if self.since is not None:
+            clauses.append("created >= ?")
+            params.append(self.since)
+        if self.until is not None:
+            clauses.append("created < ?")
+            params.append(self.until)
+        if self.phone:
+            clauses.append("phone_norm = ?")
+            params.append(self.phone)
+        if self.user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(self.user_id)
+        return clauses, params
+
+
+class ApplicationStore:
+    """Журнал заявок в локальном SQLite.
+
+    Заявка дописывается одной вставкой в отдельном потоке, индексы по
+    времени, нормализованному телефону и user_id позволяют выбирать
+    заявки без полного просмотра таблицы. Выгрузка идёт пачками по
+    ключу (created, id): каждая пачка — короткий запрос по индексу, так
+    что в памяти никогда не лежит больше batch строк и запись новых
+    заявок не ждёт окончания большой выгрузки.
+    """
+
+    def __init__(self, path: str, batch: int = 2000):
+        self.path = path
+        self.batch = batch
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="applications")
+        self.added = 0
+        self.exported = 0
+
+    # ---------- база (только в потоке executor) ----------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS applications ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " created REAL NOT NULL, user_id INTEGER, chat_id INTEGER,"
+                " name TEXT, phone TEXT, phone_norm TEXT, question TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS applications_created ON applications (created)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS applications_phone ON applications (phone_norm)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS applications_user ON applications (user_id)")
+        return self._conn
+
+    def _insert(self, row: tuple):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO applications (created, user_id, chat_id, name, phone, phone_norm, question)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", row,
+            )
+
+    def _page(self, filter_: Filter, after: Optional[tuple], limit: int):
+        clauses, params = filter_.where()
+        if after is not None:
+            clauses.append("(created, id) > (?, ?)")
+            params.extend(after)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM applications"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created, id LIMIT ?"
+        return self._connect().execute(sql, params + [limit]).fetchall()
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---------- API ----------
+    async def add(self, user_id: int, chat_id: int, name: str, phone: str, question: str,
+                  created: float = None):
+        row = (time.time() if created is None else created, user_id, chat_id,
+               name, phone, normalize_phone(phone), question)
+        await self._db(self._insert, row)
+        self.added += 1
+
+    async def pages(self, filter_: Filter = Filter()):
+        """Строки заявок пачками (списки кортежей в порядке COLUMNS)."""
+        after, left = None, filter_.limit
+        while left is None or left > 0:
+            size = self.batch if left is None else min(self.batch, left)
+            rows = await self._db(self._page, filter_, after, size)
+            if not rows:
+                return
+            self.exported += len(rows)
+            yield rows
+            if len(rows) < size:
+                return
+            if left is not None:
+                left -= len(rows)
+            after = (rows[-1][1], rows[-1][0])
+
+    def close(self):
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        return {"added": self.added, "exported": self.exported}
+
+
+# ---------- форматы выгрузки ----------
+def _iso(created: float) -> str:
+    return datetime.fromtimestamp(created, timezone.utc).isoformat(timespec="seconds")
+
+
+def csv_header() -> str:
+    return ",".join(COLUMNS) + "\r\n"
+
+
+def _cell(value):
+    # «+7 777…» или «=HYPERLINK(…)» из пользовательского текста Excel принял бы за формулу
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def csv_chunk(rows) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows((r[0], _iso(r[1])) + tuple(map(_cell, r[2:])) for r in rows)
+    return buf.getvalue()
+
+
+def jsonl_chunk(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(COLUMNS, (r[0], _iso(r[1])) + r[2:])), ensure_ascii=False) + "\n"
+        for r in rows
+    )
@@ -0,0 +1,102 @@
+"""Считает исходящие вызовы Bot API на типовые сценарии пользователя.
+
+Bot.request подменяется счётчиком, апдейты прогоняются через dp напрямую,
+уведомления админу досылаются из outbox после каждого сценария.
+
+Запуск: python bench/api_calls.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123456:bench-token-bench-token-bench-token")
+os.environ.setdefault("ADMIN_CHAT_ID", "1")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="maral-bench-"))
+os.environ.setdefault("FSM_STORAGE", "memory")
+
+from aiogram import Bot, types  # noqa: E402
+
+calls = Counter()
+
+
+async def fake_request(self, method, data=None, files=None, **kwargs):
+    calls[method] += 1
+    if method.startswith("send") or method == "editMessageText":
+        chat_id = (data or {}).get("chat_id", 1)
+        return {"message_id": sum(calls.values()), "date": 0, "text": "",
+                "chat": {"id": chat_id, "type": "private"}}
+    return True
+
+Bot.request = fake_request
+
+import main  # noqa: E402
+
+CHAT = 777
+_ids = iter(range(1, 10 ** 9))
+
+
+def message(text=None, contact=None):
+    update_id = next(_ids)
+    msg = {"message_id": update_id, "date": 0,
+           "chat": {"id": CHAT, "type": "private"},
+           "from": {"id": CHAT, "is_bot": False, "first_name": "Ұстаз"}}
+    if text is not None:
+        msg["text"] = text
+    if contact is not None:
+        msg["contact"] = {"phone_number": contact, "first_name": "Ұстаз"}
+    return {"update_id": update_id, "message": msg}
+
+
+def callback(data):
+    update_id = next(_ids)
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "bench", "data": data,
+        "from": {"id": CHAT, "is_bot": False, "first_name": "Ұстаз"},
+        "message": {"message_id": 1, "date": 0, "text": "…",
+                    "chat": {"id": CHAT, "type": "private"}}}}
+
+
+SCENARIOS = {
+    "заявка (контакт)": [
+        message("📝 Өтінім қалдыру"), message("Айгүл Серікқызы"),
+        message(contact="+77771234567"), message("Ашық сабаққа қалай дайындаламын?"),
+    ],
+    "заявка (вручную)": [
+        message("📝 Өтінім қалдыру"), message("Айгүл Серікқызы"),
+        message("✍️ Өзім жазамын"), message("+7 (777) 123-45-67"),
+        message("Ашық сабаққа қалай дайындаламын?"),
+    ],
+    "заявка с возвратом": [
+        message("📝 Өтінім қалдыру"), message("Айгүл"),
+        callback("back_to_name_prev"), message("Айгүл Серікқызы"),
+        message(contact="+77771234567"), message("Сұрақ"),
+    ],
+    "FAQ: раздел и назад": [
+        message("📄 Жиі қойылатын сұрақтар"), callback("faq_subjects"),
+        callback("faq_back_to_categories"), callback("faq_cert"),
+        callback("faq_back_to_categories"), callback("faq_back_to_main"),
+    ],
+}
+
+
+async def run():
+    from aiogram import Dispatcher
+    Dispatcher.set_current(main.dp)
+    Bot.set_current(main.bot)
+    for name, updates in SCENARIOS.items():
+        calls.clear()
+        for raw in updates:
+            # отдельная задача на апдейт, как в вебхуке: aiogram кэширует
+            # состояние FSM в contextvars
+            await asyncio.create_task(main.dp.process_update(types.Update(**raw)))
+        await main.outbox.drain()
+        total = sum(calls.values())
+        detail = ", ".join(f"{m}={n}" for m, n in sorted(calls.items()))
+        print(f"{name:22} {total:3} вызовов  ({detail})")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,122 @@
+"""Бенчмарк журнала заявок: выгрузка CSV/JSONL и выборки по индексам.
+
+Журнал заполняется синтетическими заявками (по умолчанию 300 тысяч за
+год), затем /admin/applications из main.py запрашивается настоящим
+HTTP-клиентом. Для каждой выгрузки: время до первого байта, полное время,
+строк в секунду и прирост пикового RSS процесса — он не должен зависеть
+от числа строк, ответ отдаётся потоком.
+
+Запуск: python bench/applications_export.py [--rows 300000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOKEN = "export-bench-token"
+YEAR = 365 * 24 * 3600
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=300_000, help="заявок в журнале")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def fill(store, rows: int, seed: int):
+    from applications import normalize_phone
+    rnd = random.Random(seed)
+    start = time.time() - YEAR
+    conn = store._connect()
+    batch = []
+    for i in range(rows):
+        user = rnd.randrange(rows // 3 + 1)
+        phone = f"+7 7{user % 100:02d} {user % 1000:03d} {i % 100:02d} {user % 97:02d}"
+        batch.append((start + YEAR * i / rows, user, user, f"Ұстаз {user}", phone,
+                      normalize_phone(phone), "Ашық сабаққа қалай дайындалу керек? " * rnd.randint(1, 4)))
+        if len(batch) == 10_000:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO applications (created, user_id, chat_id, name, phone, phone_norm, question)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        with conn:
+            conn.executemany(
+                "INSERT INTO applications (created, user_id, chat_id, name, phone, phone_norm, question)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(args):
+    import aiohttp
+    from aiohttp import web
+
+    os.environ.update({
+        "BOT_TOKEN": "123456:export-bench-token-export-bench",
+        "ADMIN_CHAT_ID": "1",
+        "ADMIN_API_TOKEN": TOKEN,
+        "DATA_DIR": tempfile.mkdtemp(prefix="maral-export-"),
+    })
+    import main
+
+    started = time.perf_counter()
+    fill(main.applications, args.rows, args.seed)
+    print(f"журнал: {args.rows} заявок, заполнение {time.perf_counter() - started:.1f} с")
+
+    app = web.Application()
+    app.router.add_get("/admin/applications", main.export_applications)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/admin/applications"
+
+    phone, user = main.applications._connect().execute(
+        "SELECT phone, user_id FROM applications WHERE id = ?", (args.rows // 2,)).fetchone()
+    month_ago = time.strftime("%Y-%m-%d", time.gmtime(time.time() - 30 * 24 * 3600))
+    cases = [
+        ("весь журнал, CSV", {"format": "csv"}),
+        ("весь журнал, JSONL", {"format": "jsonl"}),
+        ("последний месяц", {"since": month_ago}),
+        ("по телефону", {"phone": phone}),
+        ("по user_id", {"user_id": str(user)}),
+        ("первые 1000", {"limit": "1000"}),
+    ]
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    print(f"\n{'выгрузка':20} {'строк':>8} {'МБ':>7} {'1-й байт, мс':>13} {'всего, с':>9} {'строк/с':>9} {'+RSS, МБ':>9}")
+    async with aiohttp.ClientSession(headers=headers) as session:
+        for name, params in cases:
+            rss = peak_rss_mb()
+            started = time.perf_counter()
+            first = None
+            size = lines = 0
+            async with session.get(base, params=params) as response:
+                assert response.status == 200, response.status
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    if first is None:
+                        first = time.perf_counter() - started
+                    size += len(chunk)
+                    lines += chunk.count(b"\n")
+            total = time.perf_counter() - started
+            rows = lines - (1 if params.get("format", "csv") == "csv" else 0)
+            print(f"{name:20} {rows:8} {size / 1e6:7.1f} {(first or 0) * 1e3:13.1f} {total:9.2f} "
+                  f"{rows / total:9.0f} {peak_rss_mb() - rss:9.1f}")
+
+    await runner.cleanup()
+    main.applications.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,131 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Отвечает на любые методы правдоподобными результатами, записывает каждый
+вызов, умеет добавлять задержку и отвечать 429 с retry_after. Апдейты,
+положенные через push_update(), отдаются getUpdates с настоящей семантикой
+offset; webhook_error имитирует вебхук, до которого Telegram не достучался.
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+LIMITED_PREFIXES = ("send", "edit", "forward", "copy")
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, p429: float = 0.0, retry_after: int = 1,
+                 seed: int = 0, method_latency: dict = None):
+        self.latency = latency
+        self.method_latency = dict(method_latency or {})   # метод -> своя задержка, с
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.rejected = 0
+        self.log = []               # (время, метод, chat_id)
+        self.webhook_url = ""
+        self.webhook_error = None    # текст last_error_message, пока вебхук «не работает»
+        self.updates = []            # неподтверждённые апдейты для getUpdates
+        self._new_updates = asyncio.Event()
+        self._message_id = 0
+        self._runner = None
+        self.url = None
+
+    async def _payload(self, request):
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        data = await self._payload(request)
+        latency = self.method_latency.get(method, self.latency)
+        if latency:
+            await asyncio.sleep(latency)
+        if method == "getUpdates":
+            return await self._get_updates(data)
+        if (self.p429 and method.startswith(LIMITED_PREFIXES)
+                and self.random.random() < self.p429):
+            self.rejected += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        self.calls[method] += 1
+        chat_id = data.get("chat_id")
+        self.log.append((time.monotonic(), method, chat_id))
+        return web.json_response({"ok": True, "result": self._result(method, data)})
+
+    def _result(self, method, data):
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Maral", "username": "maral_bot"}
+        if method == "getWebhookInfo":
+            info = {"url": self.webhook_url, "has_custom_certificate": False,
+                    "pending_update_count": len(self.updates)}
+            if self.webhook_error and self.webhook_url:
+                info.update(last_error_date=int(time.time()), last_error_message=self.webhook_error)
+            return info
+        if method == "setWebhook":
+            self.webhook_url = data.get("url", "")
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = ""
+            return True
+        if method.startswith(("send", "edit")):
+            self._message_id += 1
+            chat_id = int(data.get("chat_id") or 0)
+            return {"message_id": data.get("message_id") or self._message_id, "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"}, "text": data.get("text", "")}
+        return True
+
+    def push_update(self, update: dict):
+        self.updates.append(update)
+        self._new_updates.set()
+
+    async def _get_updates(self, data):
+        if self.webhook_url:
+            return web.json_response({
+                "ok": False, "error_code": 409,
+                "description": "Conflict: can't use getUpdates method while webhook is active",
+            }, status=409)
+        self.calls["getUpdates"] += 1
+        offset = int(data.get("offset") or 0)
+        limit = int(data.get("limit") or 100)
+        timeout = float(data.get("timeout") or 0)
+        # всё, что меньше offset, Telegram считает подтверждённым
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return web.json_response({"ok": True, "result": self.updates[:limit]})
+
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls.clear()
+        self.log.clear()
+        self.rejected = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
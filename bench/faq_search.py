@@ -0,0 +1,82 @@
+"""Бенчмарк поиска по FAQ: реальный faq.json и синтетические корпуса.
+
+Синтетические разделы собираются из казахских и русских основ с
+окончаниями, запросы — из тех же основ в других словоформах, так что
+стемминг и свёртка букв реально работают. Для каждого размера корпуса:
+время построения индекса, размер словаря и p50/p99 одного запроса.
+
+Запуск: python bench/faq_search.py [размеры корпусов через запятую]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from faq_search import FaqIndex, term  # noqa: E402
+
+STEMS = ["сабақ", "бағалау", "құжат", "мақала", "курс", "тренинг", "аттестация", "жоба",
+         "дағды", "оқушы", "мұғалім", "ата-ана", "портфолио", "семинар", "әдіс", "жоспар",
+         "урок", "оценка", "документ", "статья", "программа", "учитель", "ученик", "проект"]
+ENDINGS = ["", "тар", "лар", "тың", "ға", "да", "дан", "ды", "ымыз", "лары", "ы", "а", "ов", "ами", "ой"]
+QUERIES = ["ашық сабаққа қалай дайындалу керек", "аттестацию как пройти", "мақала жариялау",
+           "қалыптастырушы бағалау", "курсы повышения квалификации", "портфолио рәсімдеу",
+           "привет", "сәлем"]
+
+
+def synthetic_docs(n: int, rnd: random.Random):
+    # словарь растёт вместе с корпусом, как у настоящей базы знаний
+    vocab = [f"{s}{i}" if i else s for i in range(max(1, n // 20)) for s in STEMS]
+    for i in range(n):
+        words = [rnd.choice(vocab) + rnd.choice(ENDINGS) for _ in range(rnd.randint(20, 60))]
+        yield f"faq_{i}", " ".join(words[:2]), " ".join(words)
+
+
+def synthetic_queries(n: int, rnd: random.Random):
+    vocab = [f"{s}{i}" if i else s for i in range(max(1, n // 20)) for s in STEMS]
+    return [" ".join(rnd.choice(vocab) + rnd.choice(ENDINGS) for _ in range(rnd.randint(1, 6)))
+            for _ in range(2000)]
+
+
+def measure(index: FaqIndex, queries, rounds: int = 3):
+    # первый прогон прогревает кэш term(), как у живого бота после старта
+    for q in queries:
+        index.search(q)
+    timings = []
+    for _ in range(rounds):
+        for q in queries:
+            started = time.perf_counter()
+            index.search(q)
+            timings.append(time.perf_counter() - started)
+    q = statistics.quantiles(timings, n=100)
+    return q[49] * 1e6, q[98] * 1e6
+
+
+def main():
+    sizes = [int(x) for x in (sys.argv[1] if len(sys.argv) > 1 else "6,100,1000,10000,50000").split(",")]
+    with open(os.path.join(ROOT, "faq.json"), encoding="utf-8") as f:
+        raw = json.load(f)
+    real = FaqIndex((c["id"], c["button"], c["text"]) for c in raw["categories"])
+    p50, p99 = measure(real, QUERIES)
+    print(f"faq.json: {len(real)} разделов, {real.vocabulary} терминов; запрос p50 {p50:.1f} мкс, p99 {p99:.1f} мкс")
+    for q in QUERIES[:4]:
+        print(f"  «{q}» -> {real.search(q)}")
+
+    print("\n  разделов   терминов   построение, с   запрос p50, мкс   p99, мкс")
+    rnd = random.Random(1)
+    for n in sizes:
+        docs = list(synthetic_docs(n, rnd))
+        term.cache_clear()
+        started = time.perf_counter()
+        index = FaqIndex(docs)
+        built = time.perf_counter() - started
+        p50, p99 = measure(index, synthetic_queries(n, rnd))
+        print(f"  {n:8}   {index.vocabulary:8}   {built:13.3f}   {p50:15.1f}   {p99:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Бенчмарк памяти FSM: миллионы брошенных форм заявки.
+
+Каждый синтетический пользователь начинает RequestForm, вводит имя и
+бросает форму на шаге телефона — ровно то, что копится в MemoryStorage
+неделями. Часы подменяются: пользователи приходят равномерно за --days
+суток, так что при TTL в сутки живыми остаются только последние.
+
+Для SessionStorage с TTL печатается по ходу: живые сессии, оценка
+памяти из stats() и RSS процесса — они должны выйти на плато. Для
+сравнения aiogram MemoryStorage прогоняется на --baseline сессиях:
+его память растёт линейно.
+
+Запуск: python bench/fsm_sessions.py [--sessions 2000000] [--days 30] [--ttl 86400]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+
+import fsm_storage  # noqa: E402
+
+NAME = "RequestForm:waiting_for_name"
+PHONE = "RequestForm:waiting_for_phone"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=2_000_000, help="брошенных форм")
+    parser.add_argument("--days", type=float, default=30, help="за сколько суток они приходят")
+    parser.add_argument("--ttl", type=float, default=86400, help="FSM_TTL, с")
+    parser.add_argument("--baseline", type=int, default=200_000, help="сессий для MemoryStorage")
+    return parser.parse_args(argv)
+
+
+class Clock:
+    """Подменяет time в fsm_storage: время идёт по расписанию прихода пользователей."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def abandon(storage, user: int):
+    await storage.set_state(chat=user, user=user, state=NAME)
+    await storage.update_data(chat=user, user=user, name=f"Ұстаз {user}")
+    await storage.set_state(chat=user, user=user, state=PHONE)
+
+
+async def run(args):
+    clock = Clock()
+    fsm_storage.time = clock
+    step = args.days * 86400 / args.sessions
+
+    print(f"SessionStorage, TTL {args.ttl:.0f} с, {args.sessions} форм за {args.days:g} сут")
+    print(f"{'форм':>10} {'живых':>9} {'истекло':>10} {'stats, МБ':>10} {'RSS, МБ':>9} {'мкс/форма':>10}")
+    storage = fsm_storage.SessionStorage(ttl=args.ttl)
+    report_every = max(1, args.sessions // 10)
+    started = time.perf_counter()
+    for user in range(1, args.sessions + 1):
+        clock.now += step
+        await abandon(storage, user)
+        if user % report_every == 0:
+            gc.collect()
+            stats = storage.stats()
+            per_form = (time.perf_counter() - started) / user * 1e6
+            print(f"{user:10} {stats['sessions']:9} {stats['expired']:10} "
+                  f"{stats['memory_bytes'] / 2**20:10.1f} {rss_mb():9.1f} {per_form:10.1f}")
+    del storage
+    gc.collect()
+
+    print(f"\naiogram MemoryStorage, без TTL, {args.baseline} форм")
+    print(f"{'форм':>10} {'живых':>9} {'RSS, МБ':>9}")
+    baseline = MemoryStorage()
+    report_every = max(1, args.baseline // 5)
+    for user in range(1, args.baseline + 1):
+        await abandon(baseline, user)
+        if user % report_every == 0:
+            print(f"{user:10} {len(baseline.data):9} {rss_mb():9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,269 @@
+"""Нагрузочный тест вебхука на синтетическом потоке апдейтов.
+
+Бот поднимается целиком (create_app из main.py) и смотрит в локальную
+заглушку Bot API (bench/fake_api.py) с настраиваемой задержкой и долей
+ответов 429. Виртуальные пользователи проходят типовые сценарии: заявку
+целиком, просмотр FAQ, кнопки «назад», мусорные сообщения; часть
+апдейтов отправляется повторно, как это делает Telegram при ретраях.
+
+Отчёт: пропускная способность, p50/p95/p99 времени ответа вебхука,
+время работы каждого хендлера и число исходящих вызовов на апдейт.
+Генератор нагрузки, бот и заглушка работают в одном процессе и одном
+event loop, так что абсолютные цифры завышены — тест нужен, чтобы
+сравнивать версии между собой и ловить регрессии.
+
+Запуск: python bench/loadtest.py --users 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_api import FakeBotAPI  # noqa: E402
+
+SECRET = "loadtest-secret"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=300, help="виртуальных пользователей")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных пользователей")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка заглушки Bot API, с")
+    parser.add_argument("--p429", type=float, default=0.0, help="доля ответов 429 на отправки")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429")
+    parser.add_argument("--dup", type=float, default=0.05, help="доля повторных доставок")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза пользователя между шагами, с")
+    parser.add_argument("--real-limits", action="store_true",
+                        help="оставить лимиты Telegram (по умолчанию сняты, чтобы мерить сам бот)")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+# ---------- синтетические сценарии ----------
+class Stream:
+    def __init__(self, seed: int):
+        self.random = random.Random(seed)
+        self._update_id = 0
+        self._message_id = 0
+
+    def _next_update(self):
+        self._update_id += 1
+        return self._update_id
+
+    def _user(self, uid):
+        return {"id": uid, "is_bot": False, "first_name": f"Ұстаз {uid}", "language_code": "kk"}
+
+    def message(self, uid, text=None, contact=None):
+        self._message_id += 1
+        msg = {"message_id": self._message_id, "date": int(time.time()),
+               "chat": {"id": uid, "type": "private"}, "from": self._user(uid)}
+        if text is not None:
+            msg["text"] = text
+        if contact is not None:
+            msg["contact"] = {"phone_number": contact, "first_name": "Ұстаз", "user_id": uid}
+        return {"update_id": self._next_update(), "message": msg}
+
+    def callback(self, uid, data):
+        update_id = self._next_update()
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "chat_instance": str(uid), "data": data, "from": self._user(uid),
+            "message": {"message_id": self._message_id, "date": int(time.time()), "text": "…",
+                        "chat": {"id": uid, "type": "private"}}}}
+
+    # сценарии возвращают список фабрик, чтобы update_id шли по порядку отправки
+    def application(self, uid):
+        r = self.random
+        steps = [lambda: self.message(uid, "📝 Өтінім қалдыру"),
+                 lambda: self.message(uid, f"Айгүл {uid}")]
+        if r.random() < 0.2:
+            steps += [lambda: self.callback(uid, "back_to_name_prev"),
+                      lambda: self.message(uid, f"Айгүл Серікқызы {uid}")]
+        if r.random() < 0.5:
+            steps.append(lambda: self.message(uid, contact=f"+7777{uid:07d}"))
+        else:
+            steps += [lambda: self.message(uid, "✍️ Өзім жазамын"),
+                      lambda: self.message(uid, f"+7 (777) {uid % 1000:03d}-45-67")]
+        if r.random() < 0.2:
+            steps += [lambda: self.message(uid, "⬅️ Алдыңғы қадам"),
+                      lambda: self.message(uid, contact=f"+7777{uid:07d}")]
+        steps.append(lambda: self.message(uid, "Ашық сабаққа қалай дайындалу керек? " * r.randint(1, 5)))
+        return "заявка", steps
+
+    def faq(self, uid):
+        sections = ["faq_subjects", "faq_assessment", "faq_docs", "faq_psy", "faq_cert", "faq_other"]
+        steps = [lambda: self.message(uid, "📄 Жиі қойылатын сұрақтар")]
+        for section in self.random.sample(sections, self.random.randint(1, 4)):
+            steps += [lambda s=section: self.callback(uid, s),
+                      lambda: self.callback(uid, "faq_back_to_categories")]
+        steps.append(lambda: self.callback(uid, "faq_back_to_main"))
+        return "faq", steps
+
+    def back_buttons(self, uid):
+        return "назад", [lambda: self.message(uid, "📝 Өтінім қалдыру"),
+                         lambda: self.callback(uid, "back_to_main"),
+                         lambda: self.message(uid, "/menu")]
+
+    def junk(self, uid):
+        words = ["сәлем", "бағалау", "қалай", "??", "ok", "ашық сабақ", "😀", "привет"]
+        steps = [lambda: self.message(uid, " ".join(self.random.choices(words, k=3)))
+                 for _ in range(self.random.randint(1, 3))]
+        steps.append(lambda: self.callback(uid, "no_such_button"))
+        return "мусор", steps
+
+    def scenario(self, uid):
+        kind = self.random.choices(
+            [self.application, self.faq, self.back_buttons, self.junk], weights=[4, 4, 1, 1]
+        )[0]
+        return kind(uid)
+
+
+# ---------- замеры ----------
+def percentiles(values):
+    if len(values) < 2:
+        value = values[0] if values else 0.0
+        return value, value, value
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+def instrument_handlers(dp, timings):
+    """Оборачивает каждый хендлер замером времени выполнения."""
+    def timed(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                timings[handler.__name__].append(time.perf_counter() - started)
+        return wrapper
+
+    for observer in (dp.message_handlers, dp.callback_query_handlers):
+        for handler_obj in observer.handlers:
+            handler_obj.handler = timed(handler_obj.handler)
+
+
+async def wait_idle(main, timeout: float = 60.0):
+    """Ждёт, пока бот разберёт очередь апдейтов и исходящих сообщений."""
+    deadline = time.monotonic() + timeout
+    scheduler = main.bot.scheduler
+    while time.monotonic() < deadline:
+        busy = (main.update_queue.depth() or scheduler.stats()["queued"]
+                or scheduler.stats()["inflight"])
+        if not busy:
+            await asyncio.sleep(0.05)
+            if not (main.update_queue.depth() or scheduler.stats()["queued"]):
+                return True
+        await asyncio.sleep(0.02)
+    return False
+
+
+async def run(args):
+    import aiohttp
+    from aiohttp import web
+
+    api = FakeBotAPI(latency=args.api_latency, p429=args.p429,
+                     retry_after=args.retry_after, seed=args.seed)
+    api_url = await api.start()
+
+    os.environ.update({
+        "BOT_TOKEN": "123456:loadtest-token-loadtest-token-xx",
+        "ADMIN_CHAT_ID": "1",
+        "WEBHOOK_SECRET": SECRET,
+        "TG_API_URL": api_url,
+    })
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="maral-loadtest-"))
+    os.environ.setdefault("OUTBOX_BATCH_WINDOW", "0.2")
+    if not args.real_limits:
+        os.environ.setdefault("TG_GLOBAL_RATE", "100000")
+        os.environ.setdefault("TG_CHAT_RATE", "100000")
+        os.environ.setdefault("TG_CHAT_BURST", "100000")
+
+    import main
+
+    handler_timings = defaultdict(list)
+    instrument_handlers(main.dp, handler_timings)
+
+    runner = web.AppRunner(main.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    webhook = f"http://127.0.0.1:{port}{main.WEBHOOK_PATH}"
+    await wait_idle(main)
+    api.reset()
+
+    stream = Stream(args.seed)
+    latencies = []
+    statuses = Counter()
+    kinds = Counter()
+    sent = {"unique": 0, "duplicates": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET, "Content-Type": "application/json"}
+
+    async def post(session, body):
+        started = time.perf_counter()
+        async with session.post(webhook, data=body, headers=headers) as response:
+            await response.read()
+            statuses[response.status] += 1
+        latencies.append(time.perf_counter() - started)
+
+    async def user(session, uid):
+        async with semaphore:
+            kind, steps = stream.scenario(uid)
+            kinds[kind] += 1
+            for make in steps:
+                body = json.dumps(make(), ensure_ascii=False).encode()
+                await post(session, body)
+                sent["unique"] += 1
+                if stream.random.random() < args.dup:
+                    await post(session, body)
+                    sent["duplicates"] += 1
+                if args.think:
+                    await asyncio.sleep(args.think)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(user(session, 10_000 + i) for i in range(args.users)))
+    ingest_time = time.perf_counter() - started
+    idle = await wait_idle(main)
+    await main.outbox.drain()
+    total_time = time.perf_counter() - started
+
+    stats = main.update_dedup.stats()
+    await runner.cleanup()
+    await api.stop()
+
+    # ---------- отчёт ----------
+    requests = len(latencies)
+    p50, p95, p99 = percentiles(latencies)
+    print(f"пользователей {args.users} ({', '.join(f'{k}: {v}' for k, v in kinds.items())}), "
+          f"параллельно {args.concurrency}, задержка API {args.api_latency * 1000:.0f} мс, "
+          f"429: {args.p429:.0%}")
+    print(f"апдейтов {sent['unique']} + повторов {sent['duplicates']} = {requests} запросов; "
+          f"коды ответа {dict(statuses)}; отсечено дублей {stats['hits']}")
+    print(f"приём: {requests / ingest_time:8.1f} запросов/с за {ingest_time:.2f} с; "
+          f"полная обработка {sent['unique'] / total_time:8.1f} апдейтов/с за {total_time:.2f} с"
+          + ("" if idle else " (очередь не опустела!)"))
+    print(f"вебхук: p50 {p50 * 1000:.2f} мс, p95 {p95 * 1000:.2f} мс, p99 {p99 * 1000:.2f} мс")
+    print(f"исходящих вызовов {api.total()} ({api.total() / max(1, sent['unique']):.2f} на апдейт), "
+          f"429 отдано {api.rejected}: {dict(api.calls)}")
+    print("хендлеры:                    вызовов    p50 мс    p95 мс    p99 мс")
+    for name, values in sorted(handler_timings.items(), key=lambda kv: -len(kv[1])):
+        h50, h95, h99 = percentiles(values)
+        print(f"  {name:26} {len(values):8} {h50 * 1000:9.2f} {h95 * 1000:9.2f} {h99 * 1000:9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,95 @@
+"""Проверка пула соединений Bot API на локальной заглушке.
+
+Поднимает aiohttp-сервер, притворяющийся Bot API, и считает, сколько
+запросов пришло по новым TCP-соединениям, а сколько — по уже открытым.
+Сценарий: старт (с прогревом или без) -> пачка параллельных отправок ->
+пауза простоя -> ещё одна пачка.
+
+Запуск: python bench/pool_reuse.py [пауза_простоя_сек]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+
+from http_pool import PoolSettings, PooledBot  # noqa: E402
+
+TOKEN = "123456:bench-token-bench-token-bench-token"
+
+
+class CountingServer:
+    def __init__(self):
+        self.transports = set()
+        self.requests = 0
+        self.new_connections = 0
+
+    async def handle(self, request):
+        self.requests += 1
+        transport = id(request.transport)
+        if transport not in self.transports:
+            self.transports.add(transport)
+            self.new_connections += 1
+        method = request.match_info["method"]
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "bench"}
+        else:
+            result = {"message_id": self.requests, "date": 0, "text": "",
+                      "chat": {"id": 1, "type": "private"}}
+        return web.json_response({"ok": True, "result": result})
+
+    def reset(self):
+        self.transports.clear()
+        self.requests = 0
+        self.new_connections = 0
+
+
+async def scenario(bot, server, idle: float, burst: int = 10):
+    started = time.perf_counter()
+    await bot.prewarm()
+    warm = server.new_connections
+    t0 = time.perf_counter()
+    await bot.send_message(1, "first")
+    first = time.perf_counter() - t0
+    await asyncio.gather(*(bot.send_message(1, f"a{i}") for i in range(burst)))
+    await asyncio.sleep(idle)
+    await asyncio.gather(*(bot.send_message(1, f"b{i}") for i in range(burst)))
+    total = time.perf_counter() - started
+    reused = server.requests - server.new_connections
+    print(f"  прогрев открыл {warm}, первая отправка {first * 1000:.1f} мс; "
+          f"запросов {server.requests}: новых соединений {server.new_connections}, "
+          f"повторно использовано {reused}; всего {total:.2f} с")
+
+
+async def main():
+    idle = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    server = CountingServer()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    api_url = f"http://127.0.0.1:{port}"
+
+    cases = (
+        ("без прогрева, keepalive 1 с", PoolSettings(keepalive=1, prewarm=0)),
+        ("прогрев 4, keepalive 1 с", PoolSettings(keepalive=1, prewarm=4)),
+        ("прогрев 4, keepalive 60 с", PoolSettings(keepalive=60, prewarm=4)),
+    )
+    print(f"пауза простоя между пачками: {idle} с")
+    for name, pool in cases:
+        server.reset()
+        bot = PooledBot(TOKEN, pool=pool, api_url=api_url)
+        print(name)
+        await scenario(bot, server, idle)
+        await bot.close_session()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
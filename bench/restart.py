@@ -0,0 +1,195 @@
+"""Рестарт под нагрузкой: не теряется ли ни один апдейт.
+
+Генератор ведёт себя как Telegram: шлёт апдейты на вебхук и, пока не
+получит 200, повторяет доставку (на 503, ошибку соединения, таймаут).
+Каждый апдейт — /start из отдельного чата, так что по вызовам заглушки
+Bot API видно, получил ли каждый чат свой ответ.
+
+Посреди потока поднимается второй экземпляр main.py, «балансировщик»
+переключается на него, а старый получает SIGTERM и ещё какое-то время
+продолжает получать запросы — как при rolling-редеплое. Заглушка отвечает
+с задержкой, поэтому в момент остановки в очереди старого экземпляра
+есть необработанные апдейты.
+
+Итог: сколько апдейтов принято, сколько чатов получили ответ, сколько
+ответов пришло дважды. С --kill старый экземпляр убивается SIGKILL —
+видно, что без плавной остановки принятые апдейты теряются.
+
+Запуск: python bench/restart.py [--updates 600] [--rate 150] [--api-latency 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp  # noqa: E402
+
+from fake_api import FakeBotAPI  # noqa: E402
+
+SECRET = "restart-secret"
+TOKEN = "123456:restart-token-restart-token-xxxx"
+FIRST_CHAT = 100_000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--updates", type=int, default=600, help="всего апдейтов")
+    parser.add_argument("--rate", type=float, default=150, help="апдейтов в секунду")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка заглушки Bot API, с")
+    parser.add_argument("--restart-at", type=float, default=0.5, help="доля потока до рестарта")
+    parser.add_argument("--overlap", type=float, default=0.5,
+                        help="сколько секунд старый экземпляр ещё получает запросы после SIGTERM")
+    parser.add_argument("--kill", action="store_true", help="SIGKILL вместо SIGTERM")
+    return parser.parse_args(argv)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Instance:
+    def __init__(self, api_url: str, name: str):
+        self.name = name
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = None
+        self.env = dict(os.environ)
+        self.env.update({
+            "BOT_TOKEN": TOKEN,
+            "ADMIN_CHAT_ID": "1",
+            "WEBHOOK_SECRET": SECRET,
+            "WEBHOOK_HOST": "http://127.0.0.1:1",        # адрес «балансировщика», заглушке всё равно
+            "WEBAPP_HOST": "127.0.0.1",
+            "PORT": str(self.port),
+            "TG_API_URL": api_url,
+            "DATA_DIR": tempfile.mkdtemp(prefix=f"maral-restart-{name}-"),
+            "POLL_FALLBACK": "0",
+            "TG_GLOBAL_RATE": "100000",
+            "TG_CHAT_RATE": "100000",
+            "TG_CHAT_BURST": "100000",
+        })
+
+    async def start(self, session: aiohttp.ClientSession):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(ROOT, "main.py"), cwd=ROOT, env=self.env,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        while True:
+            try:
+                async with session.get(self.url + "/ready") as r:
+                    if r.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.02)
+
+    def signal(self, sig):
+        self.proc.send_signal(sig)
+
+    async def wait(self) -> float:
+        started = time.monotonic()
+        await self.proc.wait()
+        return time.monotonic() - started
+
+
+def start_update(update_id: int) -> bytes:
+    chat = FIRST_CHAT + update_id
+    user = {"id": chat, "is_bot": False, "first_name": "Ұстаз"}
+    return json.dumps({"update_id": update_id, "message": {
+        "message_id": 1, "date": int(time.time()), "text": "/start",
+        "chat": {"id": chat, "type": "private"}, "from": user,
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }}).encode()
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.api_latency)
+    api_url = await api.start()
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET, "Content-Type": "application/json"}
+    statuses = Counter()
+    target = {}
+    deliveries = Counter()
+
+    async def deliver(session, update_id):
+        """Как Telegram: повторяет, пока апдейт не примут."""
+        body = start_update(update_id)
+        delay = 0.05
+        while True:
+            deliveries[update_id] += 1
+            try:
+                async with session.post(target["url"] + "/webhook", data=body, headers=headers) as r:
+                    statuses[r.status] += 1
+                    if r.status == 200:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                statuses[type(e).__name__] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        old, new = Instance(api_url, "old"), Instance(api_url, "new")
+        await old.start(session)
+        target["url"] = old.url
+        print(f"старый экземпляр готов; {args.updates} апдейтов по {args.rate:.0f}/с, "
+              f"ответ Bot API {args.api_latency * 1e3:.0f} мс")
+
+        async def restart():
+            await asyncio.sleep(args.updates * args.restart_at / args.rate)
+            await new.start(session)
+            depth = None
+            try:
+                async with session.get(old.url + "/stats") as r:
+                    depth = (await r.json())["update_queue"]["depth"]
+            except aiohttp.ClientError:
+                pass
+            old.signal(signal.SIGKILL if args.kill else signal.SIGTERM)
+            print(f"рестарт: новый готов, в очереди старого {depth} апдейтов, "
+                  f"{'SIGKILL' if args.kill else 'SIGTERM'}")
+            # «балансировщик» ещё немного шлёт на старый экземпляр
+            await asyncio.sleep(args.overlap)
+            target["url"] = new.url
+            print(f"старый завершился за {await old.wait():.2f} с")
+
+        restarter = asyncio.create_task(restart())
+        senders = []
+        for update_id in range(1, args.updates + 1):
+            senders.append(asyncio.create_task(deliver(session, update_id)))
+            await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*senders)
+        await restarter
+
+        # ждём, пока новый экземпляр доотвечает
+        expected = set(range(FIRST_CHAT + 1, FIRST_CHAT + args.updates + 1))
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            replied = {chat for _, method, chat in api.log if method == "sendMessage"}
+            if expected <= {int(c) for c in replied if c is not None}:
+                break
+            await asyncio.sleep(0.2)
+        new.signal(signal.SIGTERM)
+        await new.wait()
+
+    replies = Counter(int(chat) for _, method, chat in api.log if method == "sendMessage" and chat)
+    answered = sum(1 for chat in expected if replies[chat])
+    twice = sum(1 for chat in expected if replies[chat] > 1)
+    print(f"\nответы вебхука: {dict(statuses)}")
+    print(f"повторных доставок: {sum(deliveries.values()) - args.updates}")
+    print(f"чатов с ответом: {answered}/{args.updates}, потеряно: {args.updates - answered}, "
+          f"ответов дважды: {twice}")
+    await api.stop()
+    return args.updates - answered
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run(parse_args())) else 0)
@@ -0,0 +1,111 @@
+"""Бенчмарк диспетчеризации: перебор фильтров aiogram против таблицы маршрутов.
+
+Диспетчер собирается как в main.py: команды, кнопки Text(equals=...) в
+разных состояниях, «ловящие всё» хендлеры состояний, callback-кнопки,
+лямбда по префиксу и catch-all в конце. Число кнопок растёт; для каждого
+размера меряется время dp.process_update на апдейт (хендлеры пустые,
+MemoryStorage), отдельно для кнопок из конца списка, свободного текста и
+callback-запросов.
+
+Запуск: python bench/routing.py [числа кнопок через запятую]
+"""
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+from aiogram.dispatcher.filters import Text  # noqa: E402
+from aiogram.dispatcher.filters.state import State, StatesGroup  # noqa: E402
+
+import routing  # noqa: E402
+
+TOKEN = "123456:bench-token-bench-token-bench-token"
+
+
+class Form(StatesGroup):
+    name = State()
+    phone = State()
+    question = State()
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+def build(buttons: int, routed: bool) -> Dispatcher:
+    dp = Dispatcher(Bot(TOKEN), storage=MemoryStorage())
+    dp.register_message_handler(noop, commands=["start"], state="*")
+    for i in range(buttons // 2):
+        dp.register_message_handler(noop, Text(equals=f"Кнопка {i}"), state="*")
+    for state in (Form.name, Form.phone, Form.question):
+        dp.register_message_handler(noop, Text(equals="⬅️ Артқа"), state=state)
+        dp.register_message_handler(noop, state=state)
+    for i in range(buttons // 2, buttons):
+        dp.register_message_handler(noop, Text(equals=f"Кнопка {i}"), state="*")
+    dp.register_message_handler(noop, commands=["menu"], state="*")
+    dp.register_message_handler(noop, state="*")
+    for i in range(buttons):
+        dp.register_callback_query_handler(noop, Text(equals=f"btn_{i}"), state="*")
+    dp.register_callback_query_handler(noop, lambda c: c.data.startswith("faq_"), state="*")
+    dp.register_callback_query_handler(noop, lambda c: True, state="*")
+    if routed:
+        routing.install(dp)
+    return dp
+
+
+def updates(buttons: int):
+    user = {"id": 7, "is_bot": False, "first_name": "Ұстаз"}
+    chat = {"id": 7, "type": "private"}
+
+    def message(text):
+        return types.Update(update_id=1, message={
+            "message_id": 1, "date": 0, "chat": chat, "from": user, "text": text})
+
+    def callback(data):
+        return types.Update(update_id=1, callback_query={
+            "id": "1", "chat_instance": "1", "data": data, "from": user,
+            "message": {"message_id": 1, "date": 0, "chat": chat}})
+
+    return {
+        "последняя кнопка": message(f"Кнопка {buttons - 1}"),
+        "свободный текст": message("Ашық сабақ туралы сұрақ"),
+        "callback-кнопка": callback(f"btn_{buttons - 1}"),
+        "callback faq_": callback("faq_subjects"),
+    }
+
+
+async def measure(dp: Dispatcher, update: types.Update, rounds: int) -> float:
+    Dispatcher.set_current(dp)
+    Bot.set_current(dp.bot)
+
+    async def one():
+        # у каждого апдейта свой контекст, как в UpdateQueue
+        await dp.process_update(update)
+
+    for _ in range(50):
+        await asyncio.create_task(one())
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.create_task(one())
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+async def main():
+    sizes = [int(x) for x in (sys.argv[1] if len(sys.argv) > 1 else "10,50,200,1000").split(",")]
+    print(f"{'кнопок':>7}  {'апдейт':18} {'перебор, мкс':>13} {'таблица, мкс':>13}")
+    for buttons in sizes:
+        rounds = max(200, 20000 // buttons)
+        stock, routed = build(buttons, False), build(buttons, True)
+        for name, update in updates(buttons).items():
+            before = await measure(stock, update, rounds)
+            after = await measure(routed, update, rounds)
+            print(f"{buttons:7}  {name:18} {before:13.1f} {after:13.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
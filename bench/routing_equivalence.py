@@ -0,0 +1,127 @@
+"""Проверка таблицы маршрутов: выбирает ли она тот же хендлер, что aiogram.
+
+Берёт настоящий диспетчер из main.py и перебирает все сочетания:
+состояние FSM (каждое, что встречается в фильтрах, «без состояния» и
+неизвестное) × текст (каждая кнопка Text(equals=...), каждая команда,
+команда с пробелом впереди, свободный текст) плюс контакт, а для
+callback-запросов — каждая callback_data и незнакомая. Для каждого случая
+первый хендлер, чьи фильтры прошли, ищется дважды: обычным перебором
+всего списка, как Handler.notify, и по списку из таблицы маршрутов.
+Любое расхождение печатается, код выхода — 1.
+
+Запуск: python bench/routing_equivalence.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("BOT_TOKEN", "123456:bench-token-bench-token-bench-token")
+os.environ.setdefault("ADMIN_CHAT_ID", "1")
+os.environ.setdefault("FSM_STORAGE", "memory")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="maral-routing-"))
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.dispatcher.filters import Command  # noqa: E402
+from aiogram.dispatcher.filters.filters import FilterNotPassed, check_filters  # noqa: E402
+
+import main  # noqa: E402
+import routing  # noqa: E402
+
+CHAT = 1
+USER = {"id": CHAT, "is_bot": False, "first_name": "Ұстаз"}
+FREE_TEXT = ("сәлем", "+7 777 123 45 67", "")
+UNKNOWN_STATE = "Unknown:state"
+
+
+def keys_and_states(observer):
+    """Все тексты/callback_data и состояния, которые упоминают фильтры."""
+    keys, states = set(), {None, UNKNOWN_STATE}
+    for obj in observer.handlers:
+        route = routing._Route(obj)
+        states.update(s for s in route.states or () if s != routing.ANY_STATE)
+        for f in obj.filters or ():
+            filter_ = f.filter
+            if isinstance(filter_, Command):
+                for command in filter_.commands:
+                    keys.update(prefix + command for prefix in filter_.prefixes)
+                    keys.add(" " + filter_.prefixes[0] + command)
+        if isinstance(route.keys, frozenset):
+            keys.update(route.keys)
+    return keys, states
+
+
+def message(text=None, contact=None) -> types.Message:
+    data = {"message_id": 1, "date": 0, "chat": {"id": CHAT, "type": "private"}, "from": USER}
+    if contact:
+        data["contact"] = {"phone_number": "+77771234567", "first_name": "Ұстаз"}
+    else:
+        data["text"] = text
+    return types.Message(**data)
+
+
+def callback(data: str) -> types.CallbackQuery:
+    return types.CallbackQuery(**{
+        "id": "1", "chat_instance": "1", "data": data, "from": USER,
+        "message": {"message_id": 1, "date": 0, "chat": {"id": CHAT, "type": "private"}},
+    })
+
+
+async def first(handlers, obj):
+    for handler_obj in handlers:
+        try:
+            await check_filters(handler_obj.filters, (obj,))
+        except FilterNotPassed:
+            continue
+        return handler_obj.handler.__name__
+    return None
+
+
+async def compare(observer, obj, state):
+    """(обычный перебор, таблица маршрутов) — каждый в своей задаче,
+    чтобы кэш состояния StateFilter не переходил из одного в другой."""
+    async def stock():
+        await main.storage.set_state(chat=CHAT, user=CHAT, state=state)
+        return await first(observer.handlers, obj)
+
+    async def routed():
+        await main.storage.set_state(chat=CHAT, user=CHAT, state=state)
+        return await first(await observer._candidates(obj), obj)
+
+    return await asyncio.create_task(stock()), await asyncio.create_task(routed())
+
+
+async def run() -> int:
+    Bot.set_current(main.bot)
+    Dispatcher.set_current(main.dp)
+    types.Chat.set_current(types.Chat(id=CHAT, type="private"))
+    types.User.set_current(types.User(**USER))
+
+    cases = []
+    texts, message_states = keys_and_states(main.message_routes)
+    for state in sorted(message_states, key=str):
+        for text in sorted(texts) + list(FREE_TEXT):
+            cases.append((main.message_routes, message(text), state, repr(text)))
+        cases.append((main.message_routes, message(contact=True), state, "контакт"))
+    datas, callback_states = keys_and_states(main.callback_routes)
+    for state in sorted(callback_states | message_states, key=str):
+        for data in sorted(datas) + ["faq_unknown", "unknown"]:
+            cases.append((main.callback_routes, callback(data), state, f"callback {data!r}"))
+
+    diffs = 0
+    for observer, obj, state, label in cases:
+        stock, routed = await compare(observer, obj, state)
+        if stock != routed:
+            diffs += 1
+            print(f"РАСХОЖДЕНИЕ: {state} {label}: перебор {stock}, таблица {routed}")
+    print(f"{len(cases)} случаев, расхождений: {diffs}")
+    print(f"сообщения: {main.message_routes.stats()}")
+    print(f"callback: {main.callback_routes.stats()}")
+    return diffs
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run()) else 0)
@@ -0,0 +1,161 @@
+"""Профиль холодного старта: через сколько бот начинает отвечать.
+
+main.py запускается отдельным процессом (как на Render) против локальной
+заглушки Bot API, у которой setWebhook отвечает медленно — так выглядит
+старт, когда Telegram тормозит. Для FAST_START=1 и FAST_START=0 меряется
+от запуска процесса:
+
+  ping     — первый ответ 200 на /ping (порт открыт);
+  webhook  — первый принятый апдейт /start на /webhook;
+  reply    — ответ пользователю дошёл до заглушки Bot API;
+  ready    — /ready отвечает 200 (пул прогрет, вебхук поставлен).
+
+Отдельно — время `python -c "import main"` и импорт модуля main по
+данным самого /ready.
+
+Запуск: python bench/startup.py [--webhook-latency 3] [--rounds 3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aiohttp  # noqa: E402
+
+from fake_api import FakeBotAPI  # noqa: E402
+
+SECRET = "startup-secret"
+TOKEN = "123456:startup-token-startup-token-xxxx"
+CHAT_ID = 77
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--webhook-latency", type=float, default=3.0, help="задержка setWebhook, с")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка остальных методов, с")
+    parser.add_argument("--rounds", type=int, default=3, help="запусков на режим")
+    return parser.parse_args(argv)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bot_env(api_url: str, port: int, fast: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": TOKEN,
+        "ADMIN_CHAT_ID": "1",
+        "WEBHOOK_SECRET": SECRET,
+        "WEBHOOK_HOST": f"http://127.0.0.1:{port}",
+        "WEBAPP_HOST": "127.0.0.1",
+        "PORT": str(port),
+        "TG_API_URL": api_url,
+        "DATA_DIR": tempfile.mkdtemp(prefix="maral-startup-"),
+        "FAST_START": "1" if fast else "0",
+        "POLL_FALLBACK": "0",
+    })
+    return env
+
+
+def start_update(update_id: int) -> bytes:
+    user = {"id": CHAT_ID, "is_bot": False, "first_name": "Ұстаз"}
+    return json.dumps({"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": "/start",
+        "chat": {"id": CHAT_ID, "type": "private"}, "from": user,
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }}).encode()
+
+
+async def wait_for(check, deadline: float, step: float = 0.005):
+    while time.monotonic() < deadline:
+        try:
+            if await check():
+                return time.monotonic()
+        except (aiohttp.ClientError, OSError):
+            pass
+        await asyncio.sleep(step)
+    raise TimeoutError
+
+
+async def one_start(api: FakeBotAPI, fast: bool) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    api.reset()
+    replies_before = len([e for e in api.log if e[1] == "sendMessage"])
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), cwd=ROOT, env=bot_env(api.url, port, fast),
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    deadline = started + 60
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET, "Content-Type": "application/json"}
+    timeout = aiohttp.ClientTimeout(total=2)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async def pinged():
+                async with session.get(base + "/ping") as r:
+                    return r.status == 200
+
+            async def accepted():
+                async with session.post(base + "/webhook", data=start_update(1), headers=headers) as r:
+                    return r.status == 200
+
+            async def replied():
+                return len([e for e in api.log if e[1] == "sendMessage"]) > replies_before
+
+            async def is_ready():
+                async with session.get(base + "/ready") as r:
+                    result["profile"] = await r.json()
+                    return r.status == 200
+
+            result = {}
+            result["ping"] = await wait_for(pinged, deadline) - started
+            result["webhook"] = await wait_for(accepted, deadline) - started
+            result["reply"] = await wait_for(replied, deadline) - started
+            result["ready"] = await wait_for(is_ready, deadline) - started
+            return result
+    finally:
+        proc.terminate()
+        await proc.wait()
+
+
+async def import_time() -> float:
+    env = bot_env("http://127.0.0.1:9", free_port(), True)
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(sys.executable, "-c", "import main", cwd=ROOT, env=env)
+    await proc.wait()
+    return time.monotonic() - started
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.api_latency,
+                     method_latency={"setWebhook": args.webhook_latency})
+    await api.start()
+    try:
+        imports = [await import_time() for _ in range(args.rounds)]
+        print(f"python -c 'import main': {statistics.median(imports) * 1e3:.0f} мс")
+        print(f"setWebhook {args.webhook_latency:.1f} с, остальные методы {args.api_latency * 1e3:.0f} мс\n")
+        print(f"{'режим':14} {'ping, с':>8} {'webhook, с':>11} {'reply, с':>9} {'ready, с':>9} {'импорт main, мс':>16}")
+        for fast in (True, False):
+            runs = [await one_start(api, fast) for _ in range(args.rounds)]
+            median = {k: statistics.median(r[k] for r in runs) for k in ("ping", "webhook", "reply", "ready")}
+            module = statistics.median(r["profile"]["import"] for r in runs) * 1e3
+            name = "FAST_START=1" if fast else "FAST_START=0"
+            print(f"{name:14} {median['ping']:8.2f} {median['webhook']:11.2f} "
+                  f"{median['reply']:9.2f} {median['ready']:9.2f} {module:16.0f}")
+    finally:
+        await api.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
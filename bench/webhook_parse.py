@@ -0,0 +1,75 @@
+"""Микробенчмарк разбора апдейта в webhook_handler: старый путь против нового.
+
+Старый путь: request.text() -> json.loads(str) -> Update -> f-string логи.
+Новый путь: request.read() -> orjson/json.loads(bytes) -> Update -> ленивые логи.
+
+Запуск: python bench/webhook_parse.py [итераций]
+"""
+import json
+import logging
+import sys
+import timeit
+
+from aiogram import types
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+logging.basicConfig(level=logging.WARNING)
+
+UPDATE = {
+    "update_id": 100500,
+    "message": {
+        "message_id": 17,
+        "date": 1700000000,
+        "chat": {"id": 123456789, "type": "private", "first_name": "Айгүл"},
+        "from": {"id": 123456789, "is_bot": False, "first_name": "Айгүл",
+                 "username": "aigul_teacher", "language_code": "kk"},
+        "text": "Қалыптастырушы бағалау туралы сұрағым бар",
+    },
+}
+BODY = json.dumps(UPDATE, ensure_ascii=False).encode()
+
+
+def old_path():
+    body = BODY.decode()                      # request.text()
+    logging.info(f"🔵 WEBHOOK ПОЛУЧЕН: {len(body)} символов")
+    json_data = json.loads(body)
+    logging.info("✅ JSON ПАРСИНГ УСПЕШЕН")
+    update = types.Update(**json_data)
+    logging.info(f"✅ UPDATE СОЗДАН: update_id={getattr(update, 'update_id', 'нет')}")
+    if update.message:
+        user = update.message.from_user
+        logging.info(f"📩 СООБЩЕНИЕ ОТ: @{user.username} (ID: {user.id})")
+        logging.info(f"📝 ТЕКСТ: {update.message.text}")
+    return update
+
+
+def new_path():
+    body = BODY                               # request.read()
+    logging.info("🔵 WEBHOOK ПОЛУЧЕН: %s байт", len(body))
+    json_data = json_loads(body)
+    return types.Update(**json_data)
+
+
+def parse_only_old():
+    return json.loads(BODY.decode())
+
+
+def parse_only_new():
+    return json_loads(BODY)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"JSON backend: {json_loads.__module__}, итераций: {number}")
+    for name, fn in (("parse old", parse_only_old), ("parse new", parse_only_new),
+                     ("full old ", old_path), ("full new ", new_path)):
+        best = min(timeit.repeat(fn, number=number, repeat=5))
+        print(f"{name}: {best / number * 1e6:8.2f} мкс/апдейт")
+
+
+if __name__ == "__main__":
+    main()
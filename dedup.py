@@ -0,0 +1,59 @@
+import time
+from collections import deque
+
+
+class UpdateDeduplicator:
+    """Отсекает повторно доставленные апдейты по update_id.
+
+    Кольцевой буфер (deque) хранит порядок поступления, словарь — быстрый
+    поиск. Старые id вытесняются по количеству (maxlen) и по возрасту (ttl).
+    Словарь указывает на актуальную запись буфера: после forget() и новой
+    доставки старая запись остаётся в буфере, но её вытеснение id не снимает.
+    """
+
+    def __init__(self, maxlen: int = 10000, ttl: float = 3600):
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self._order = deque()
+        self._seen = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self, now: float):
+        order, seen = self._order, self._seen
+        deadline = now - self.ttl
+        while order and (len(order) > self.maxlen or order[0][0] < deadline):
+            entry = order.popleft()
+            if seen.get(entry[1]) is entry:
+                del seen[entry[1]]
+
+    def is_duplicate(self, update_id) -> bool:
+        """True, если апдейт уже был; иначе запоминает его и возвращает False."""
+        if update_id is None:
+            return False
+        if update_id in self._seen:
+            self.hits += 1
+            return True
+        now = time.monotonic()
+        entry = (now, update_id)
+        self._order.append(entry)
+        self._seen[update_id] = entry
+        self.misses += 1
+        self._evict(now)
+        return False
+
+    def forget(self, update_id):
+        """Разрешает повторную доставку (апдейт не был принят в обработку)."""
+        self._seen.pop(update_id, None)
+
+    def __len__(self):
+        return len(self._seen)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._seen),
+            "maxlen": self.maxlen,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
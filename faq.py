@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import os
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from faq_search import FaqIndex
+from replies import Step
+
+
+def serialize_markup(markup) -> str:
+    """Готовый JSON клавиатуры: aiogram передаёт строку в API как есть."""
+    return json.dumps(markup.to_python(), ensure_ascii=False)
+
+
+class FaqSnapshot(NamedTuple):
+    """Неизменяемый снимок FAQ: готовые шаги с сериализованными клавиатурами."""
+    mtime: float
+    categories: tuple           # ((callback_data, кнопка, текст), ...)
+    menu: Step                  # «Қай бөлім…» + категории + «⬅️ Басты мәзірге»
+    pages: MappingProxyType     # callback_data -> шаг (раздел или меню)
+    not_found: Step
+    index: FaqIndex             # поиск по свободному тексту -> (callback_data, кнопка)
+    search_prompt: str
+
+    def search(self, text: str, limit: int = 3) -> Optional[Step]:
+        """Шаг с кнопками подходящих разделов или None, если ничего не нашлось."""
+        found = self.index.search(text, limit)
+        if not found:
+            return None
+        kb = {"inline_keyboard": [[{"text": button, "callback_data": cid}] for cid, button in found]}
+        return Step(self.search_prompt, back=json.dumps(kb, ensure_ascii=False))
+
+
+def build_snapshot(raw: dict, mtime: float = 0.0) -> FaqSnapshot:
+    """Собирает снимок из данных faq.json (ValueError при ошибке формата)."""
+    try:
+        categories = tuple(
+            (item["id"], item["button"], item["text"]) for item in raw["categories"]
+        )
+        prompt = raw["prompt"]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"неверный формат FAQ: {e!r}") from e
+    for cid, _, _ in categories:
+        if not cid.startswith("faq_"):
+            raise ValueError(f"callback_data раздела должен начинаться с faq_: {cid}")
+
+    kb = InlineKeyboardMarkup(row_width=raw.get("row_width", 2))
+    kb.add(*(InlineKeyboardButton(button, callback_data=cid) for cid, button, _ in categories))
+    kb.row(InlineKeyboardButton("⬅️ Басты мәзірге", callback_data="faq_back_to_main"))
+
+    back_to_categories = InlineKeyboardMarkup()
+    back_to_categories.add(
+        InlineKeyboardButton("⬅️ Категорияларға", callback_data="faq_back_to_categories")
+    )
+    back_to_categories = serialize_markup(back_to_categories)
+
+    menu = Step(prompt, back=serialize_markup(kb))
+    pages = {cid: Step(text, "Markdown", back=back_to_categories) for cid, _, text in categories}
+    pages["faq_back_to_categories"] = menu
+
+    return FaqSnapshot(
+        mtime=mtime,
+        categories=categories,
+        menu=menu,
+        pages=MappingProxyType(pages),
+        not_found=Step(raw.get("not_found", "Кешіріңіз, ақпарат табылмады."),
+                       back=back_to_categories),
+        index=FaqIndex(((cid, button), button, text) for cid, button, text in categories),
+        search_prompt=raw.get("search_prompt", "🔎 Мүмкін, мына бөлімдер көмектеседі:"),
+    )
+
+
+class FaqRegistry:
+    """Реестр FAQ, загруженный из JSON-файла.
+
+    Всё собирается один раз при загрузке; перезагрузка строит новый снимок
+    и подменяет ссылку целиком, так что хендлеры никогда не видят
+    «наполовину обновлённые» данные.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._snapshot: Optional[FaqSnapshot] = None
+
+    @property
+    def snapshot(self) -> FaqSnapshot:
+        return self._snapshot
+
+    def load(self) -> FaqSnapshot:
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding="utf-8") as f:
+            snapshot = build_snapshot(json.load(f), mtime)
+        self._snapshot = snapshot
+        logging.info("📚 FAQ ЗАГРУЖЕН: %s разделов, %s терминов в индексе",
+                     len(snapshot.categories), snapshot.index.vocabulary)
+        return snapshot
+
+    def reload_if_changed(self) -> bool:
+        """Перечитывает файл, если он изменился; ошибки не ломают текущий снимок."""
+        try:
+            if os.stat(self.path).st_mtime == self._snapshot.mtime:
+                return False
+            self.load()
+            return True
+        except (OSError, ValueError) as e:
+            logging.error("❌ ОШИБКА ПЕРЕЗАГРУЗКИ FAQ: %s", e)
+            return False
+
+    async def watch(self, interval: float = 30):
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
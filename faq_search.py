@@ -0,0 +1,138 @@
+import heapq
+import math
+import re
+from functools import lru_cache
+from operator import itemgetter
+
+# казахские буквы сводятся к ближайшим русским: «қалыптастырушы» и
+# «калыптастырушы» с телефона без казахской раскладки — одно и то же слово
+FOLD = str.maketrans("әғқңөұүһіё", "агкноуухие")
+
+TOKEN = re.compile(r"\w+")
+
+# окончания уже в «свёрнутом» виде
+SUFFIXES = frozenset({
+    # казахские: множественное число, падежи, принадлежность, словообразование
+    "лар", "лер", "дар", "дер", "тар", "тер",
+    "лары", "лери", "дары", "дери", "тары", "тери",
+    "нын", "нин", "дын", "дин", "тын", "тин",
+    "га", "ге", "ка", "ке", "на", "не",
+    "да", "де", "та", "те", "нда", "нде",
+    "дан", "ден", "тан", "тен", "нан", "нен",
+    "ны", "ни", "ды", "ди", "ты", "ти",
+    "мен", "бен", "пен",
+    "ым", "им", "ын", "ин", "сы", "си", "мыз", "миз", "ымыз", "имиз",
+    "лык", "лик", "дык", "дик", "тык", "тик",
+    "шы", "ши", "ган", "ген", "кан", "кен", "ып", "ип",
+    # русские: падежные окончания существительных и прилагательных, глаголы
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие",
+    "ов", "ев", "ам", "ям", "ах", "ях", "ом", "ем", "ию", "ия", "ью", "ья",
+    "ть", "ать", "ить", "ость", "ости",
+    "а", "я", "ы", "и", "о", "е", "у", "ю", "ь",
+})
+# длины окончаний от длинных к коротким: проверка — несколько поисков в set
+SUFFIX_LENGTHS = sorted({len(s) for s in SUFFIXES}, reverse=True)
+
+MIN_STEM = 4
+STOP_WORDS = frozenset({
+    "жане", "мен", "бен", "пен", "бар", "жок", "ма", "ме", "ба", "бе", "па", "пе",
+    "бул", "осы", "сиз", "не", "и", "в", "во", "на", "как", "что", "это",
+    "по", "для", "с", "к", "а", "но", "или", "у", "о", "об",
+})
+
+
+def stem(word: str) -> str:
+    """Срезает окончания, пока от слова остаётся не меньше MIN_STEM букв.
+
+    Казахские слова агглютинативны («дағдыларын»), поэтому окончания
+    снимаются несколько раз подряд. Стемминг грубый, но одинаковый для
+    текста FAQ и запроса, а большего поиску и не нужно.
+    """
+    for _ in range(4):
+        for length in SUFFIX_LENGTHS:
+            if len(word) - length >= MIN_STEM and word[-length:] in SUFFIXES:
+                word = word[:-length]
+                break
+        else:
+            break
+    return word
+
+
+@lru_cache(maxsize=65536)
+def term(word: str):
+    """Слово -> основа для индекса (регистр, казахские буквы, окончания)
+    или None для стоп-слов, чисел и однобуквенных слов."""
+    word = word.casefold().translate(FOLD)
+    if len(word) < 2 or word in STOP_WORDS or word.isdigit():
+        return None
+    return stem(word)
+
+
+def terms(text: str) -> list:
+    return [t for t in map(term, TOKEN.findall(text)) if t is not None]
+
+
+class FaqIndex:
+    """Инвертированный индекс по разделам FAQ с весами BM25.
+
+    Веса (idf и нормализация по длине раздела) считаются один раз при
+    построении, поэтому запрос — это сумма весов из нескольких коротких
+    списков и выбор лучших через heapq. Списки отсортированы по убыванию
+    веса, и у очень частых слов просматривается только max_postings первых
+    разделов: остальные почти ничего не добавили бы к оценке.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    TITLE_BOOST = 3     # слова с кнопки раздела весят как три слова из текста
+
+    def __init__(self, docs, max_postings: int = 1000):
+        """docs: [(ключ, заголовок, текст), ...]; search() возвращает ключи."""
+        self.keys = []
+        self.max_postings = max_postings
+        counts = []
+        for key, title, text in docs:
+            tf = {}
+            for t in terms(title):
+                tf[t] = tf.get(t, 0) + self.TITLE_BOOST
+            for t in terms(text):
+                tf[t] = tf.get(t, 0) + 1
+            self.keys.append(key)
+            counts.append(tf)
+
+        n = len(counts)
+        lengths = [sum(tf.values()) for tf in counts]
+        avg = sum(lengths) / n if n else 1.0
+        df = {}
+        for tf in counts:
+            for t in tf:
+                df[t] = df.get(t, 0) + 1
+
+        postings = {}
+        for doc, (tf, length) in enumerate(zip(counts, lengths)):
+            norm = self.K1 * (1 - self.B + self.B * length / avg)
+            for t, freq in tf.items():
+                idf = math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5))
+                postings.setdefault(t, []).append((doc, idf * freq * (self.K1 + 1) / (freq + norm)))
+        self._postings = {
+            t: tuple(sorted(p, key=itemgetter(1), reverse=True)) for t, p in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def vocabulary(self) -> int:
+        return len(self._postings)
+
+    def search(self, text: str, limit: int = 3) -> list:
+        scores = {}
+        postings = self._postings
+        for t in set(terms(text)):
+            for doc, weight in postings.get(t, ())[:self.max_postings]:
+                scores[doc] = scores.get(doc, 0.0) + weight
+        if not scores:
+            return []
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [self.keys[doc] for doc, _ in best]
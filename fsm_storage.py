@@ -0,0 +1,408 @@
+import asyncio
+import copy
+import json
+import logging
+import sqlite3
+import sys
+import time
+import typing
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+EXPIRE_BATCH = 64       # сколько просроченных сессий убирать за одно обращение
+
+
+class Session:
+    """Сессия FSM. Пустые data/bucket хранятся как None, а не как пустые dict."""
+    __slots__ = ("state", "data", "bucket", "touched")
+
+    def __init__(self, state=None, data=None, bucket=None, touched=0.0):
+        self.state = state
+        self.data = data or None
+        self.bucket = bucket or None
+        self.touched = touched
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data and not self.bucket
+
+
+class SessionTable:
+    """Сессии в порядке последнего изменения и их ленивое истечение.
+
+    TTL один на всех, поэтому порядок изменения совпадает с порядком
+    истечения: просроченные сессии всегда лежат в начале OrderedDict.
+    Каждое обращение к хранилищу снимает с начала не больше EXPIRE_BATCH
+    просроченных, а запрошенная сессия проверяется отдельно — полного
+    обхода таблицы нет нигде.
+
+    Ключ — chat, если chat == user (личный чат, почти всегда), иначе
+    кортеж (chat, user).
+    """
+
+    def __init__(self, ttl: typing.Optional[float] = None):
+        self.ttl = ttl or None
+        self._sessions: "OrderedDict[typing.Any, Session]" = OrderedDict()
+        self.expired = 0
+
+    @staticmethod
+    def key(chat, user):
+        return chat if chat == user else (chat, user)
+
+    @staticmethod
+    def address(key) -> tuple:
+        return key if isinstance(key, tuple) else (key, key)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __iter__(self):
+        return iter(self._sessions.items())
+
+    def _alive(self, session: Session, now: float) -> bool:
+        return self.ttl is None or now - session.touched < self.ttl
+
+    def expire(self, now: float = None, limit: int = EXPIRE_BATCH) -> list:
+        """Убирает просроченные сессии с начала таблицы; возвращает их ключи."""
+        if self.ttl is None:
+            return []
+        now = time.time() if now is None else now
+        sessions, keys = self._sessions, []
+        while sessions and len(keys) < limit:
+            key, session = next(iter(sessions.items()))
+            if self._alive(session, now):
+                break
+            del sessions[key]
+            keys.append(key)
+        self.expired += len(keys)
+        return keys
+
+    def get(self, key, now: float) -> typing.Optional[Session]:
+        session = self._sessions.get(key)
+        if session is not None and not self._alive(session, now):
+            return None
+        return session
+
+    def put(self, key, session: Session):
+        """Новая или изменённая сессия уходит в конец очереди на истечение."""
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+
+    def pop(self, key):
+        return self._sessions.pop(key, None)
+
+    def memory(self, sample: int = 200) -> int:
+        """Оценка памяти таблицы в байтах: сама таблица плюс средняя сессия по выборке."""
+        total = sys.getsizeof(self._sessions)
+        if not self._sessions:
+            return total
+        sizes = []
+        for i, (key, session) in enumerate(self._sessions.items()):
+            if i == sample:
+                break
+            size = sys.getsizeof(session) + sys.getsizeof(key)
+            if isinstance(key, tuple):
+                size += sum(sys.getsizeof(k) for k in key)
+            for value in (session.data, session.bucket):
+                if value:
+                    size += sys.getsizeof(value) + sum(
+                        sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+            sizes.append(size)
+        return total + int(sum(sizes) / len(sizes) * len(self._sessions))
+
+
+class SessionStorage(BaseStorage):
+    """FSM-хранилище в памяти на SessionTable.
+
+    Брошенная на полпути форма живёт не дольше ttl секунд с последнего
+    изменения (None — вечно, как MemoryStorage). Подклассы узнают об
+    изменённых и удалённых сессиях через _changed().
+    """
+
+    def __init__(self, ttl: typing.Optional[float] = None):
+        self._table = SessionTable(ttl)
+
+    # ---------- хуки для подклассов ----------
+    def _sessions(self) -> SessionTable:
+        return self._table
+
+    def _changed(self, key):
+        pass
+
+    # ---------- сессии ----------
+    def _key(self, chat, user):
+        chat, user = self.check_address(chat=chat, user=user)
+        return SessionTable.key(chat, user)
+
+    def _session(self, chat, user) -> typing.Optional[Session]:
+        table = self._sessions()
+        now = time.time()
+        for key in table.expire(now):
+            self._changed(key)
+        return table.get(self._key(chat, user), now)
+
+    def _update(self, chat, user, **fields):
+        table = self._sessions()
+        now = time.time()
+        for expired in table.expire(now):
+            self._changed(expired)
+        key = self._key(chat, user)
+        existed = table.get(key, now)
+        session = existed or Session()
+        for name, value in fields.items():
+            setattr(session, name, value or None)
+        session.touched = now
+        if session.empty:
+            if table.pop(key) is None:
+                return          # не было и не стало — писать нечего
+        else:
+            table.put(key, session)
+        self._changed(key)
+
+    # ---------- интерфейс BaseStorage ----------
+    async def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        session = self._session(chat, user)
+        if session is None or session.state is None:
+            return self.resolve_state(default)
+        return session.state
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        session = self._session(chat, user)
+        if session is None:
+            return copy.deepcopy(default) if default else {}
+        return copy.deepcopy(session.data) or {}
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        session = self._session(chat, user)
+        merged = dict(session.data or {}) if session else {}
+        merged.update(data or {}, **kwargs)
+        self._update(chat, user, data=merged)
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        state = self.resolve_state(state)
+        # имена состояний одни и те же у тысяч сессий — храним одну строку
+        self._update(chat, user, state=sys.intern(state) if state else None)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        self._update(chat, user, data=copy.deepcopy(data))
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        session = self._session(chat, user)
+        if session is None:
+            return copy.deepcopy(default) if default else {}
+        return copy.deepcopy(session.bucket) or {}
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        self._update(chat, user, bucket=copy.deepcopy(bucket))
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        session = self._session(chat, user)
+        merged = dict(session.bucket or {}) if session else {}
+        merged.update(bucket or {}, **kwargs)
+        self._update(chat, user, bucket=merged)
+
+    # ---------- статистика ----------
+    def sessions(self) -> int:
+        table = self._sessions()
+        for key in table.expire(limit=len(table)):
+            self._changed(key)
+        return len(table)
+
+    def state_counts(self) -> typing.Dict[str, int]:
+        """Сколько живых сессий сейчас в каждом состоянии FSM."""
+        self.sessions()
+        counts = {}
+        for _, session in self._sessions():
+            if session.state is not None:
+                counts[session.state] = counts.get(session.state, 0) + 1
+        return counts
+
+    def stats(self) -> dict:
+        table = self._sessions()
+        return {
+            "sessions": self.sessions(),
+            "ttl": table.ttl,
+            "expired": table.expired,
+            "memory_bytes": table.memory(),
+        }
+
+
+def _address_part(value: str):
+    # chat/user в базе — TEXT; в памяти — int, как их отдаёт aiogram
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class SQLiteStorage(SessionStorage):
+    """FSM-хранилище в локальном SQLite с кэшем в памяти.
+
+    Все чтения идут из кэша (при первом обращении в него загружается вся
+    таблица — там лежат только незавершённые формы, не старше ttl).
+    Изменения помечаются «грязными» и пишутся в базу пачкой раз в
+    flush_interval секунд в отдельном потоке, плюс принудительно при
+    close(). Истёкшие в кэше сессии удаляются из базы той же пачкой.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, ttl: typing.Optional[float] = None):
+        super().__init__(ttl)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn: typing.Optional[sqlite3.Connection] = None
+        self._loaded = False
+        self._dirty = set()
+        self._flush_task: typing.Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+
+    # ---------- база ----------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                " chat TEXT NOT NULL, user TEXT NOT NULL,"
+                " state TEXT, data TEXT NOT NULL, bucket TEXT NOT NULL,"
+                " updated REAL NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (chat, user))"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(fsm)")}
+            if "updated" not in columns:
+                # база до появления TTL: старым сессиям отсчёт пойдёт с момента загрузки
+                with self._conn:
+                    self._conn.execute("ALTER TABLE fsm ADD COLUMN updated REAL NOT NULL DEFAULT 0")
+        return self._conn
+
+    def _sessions(self) -> SessionTable:
+        if not self._loaded:
+            self._loaded = True
+            now = time.time()
+            # таблица держит порядок истечения: старые строки без updated
+            # получают touched=now, поэтому идут последними
+            rows = self._connect().execute(
+                "SELECT chat, user, state, data, bucket, updated FROM fsm"
+                " ORDER BY updated = 0, updated")
+            for chat, user, state, data, bucket, updated in rows:
+                key = SessionTable.key(_address_part(chat), _address_part(user))
+                self._table.put(key, Session(
+                    sys.intern(state) if state else None, json.loads(data), json.loads(bucket),
+                    updated or now,
+                ))
+            logging.info("💾 FSM ЗАГРУЖЕН ИЗ %s: %s сессий", self.path, len(self._table))
+        return self._table
+
+    def _write(self, upserts, deletes):
+        conn = self._connect()
+        with conn:
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO fsm (chat, user, state, data, bucket, updated) VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (chat, user) DO UPDATE SET"
+                    " state = excluded.state, data = excluded.data, bucket = excluded.bucket,"
+                    " updated = excluded.updated",
+                    upserts,
+                )
+            if deletes:
+                conn.executemany("DELETE FROM fsm WHERE chat = ? AND user = ?", deletes)
+
+    async def flush(self):
+        """Сбрасывает накопленные изменения в базу одной транзакцией."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            table, now = self._sessions(), time.time()
+            upserts, deletes = [], []
+            for key in dirty:
+                address = tuple(map(str, SessionTable.address(key)))
+                session = table.get(key, now)
+                if session is None:
+                    deletes.append(address)
+                else:
+                    upserts.append((*address, session.state,
+                                    json.dumps(session.data or {}, ensure_ascii=False),
+                                    json.dumps(session.bucket or {}, ensure_ascii=False),
+                                    session.touched))
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, upserts, deletes)
+            except Exception as e:
+                self._dirty |= dirty
+                logging.error("❌ ОШИБКА ЗАПИСИ FSM: %s", e)
+                return
+            self.flushes += 1
+            self.rows_written += len(dirty)
+
+    async def _delayed_flush(self):
+        # изменения, пришедшие во время записи, и ключи, вернувшиеся после
+        # неудачной записи, ждут следующего интервала в этой же задаче:
+        # _changed не заводит новую, пока _flush_task занят
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+                if not self._dirty:
+                    return
+        finally:
+            self._flush_task = None
+
+    def _changed(self, key):
+        self._dirty.add(key)
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    # ---------- интерфейс BaseStorage ----------
+    async def close(self):
+        await self.flush()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    async def wait_closed(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "dirty": len(self._dirty),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
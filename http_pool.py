@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from typing import NamedTuple, Optional
+
+import aiohttp
+from aiogram import Bot
+from aiogram.bot.api import TelegramAPIServer
+
+
+class PoolSettings(NamedTuple):
+    """Параметры пула соединений к Bot API."""
+    size: int = 20                  # всего соединений
+    keepalive: float = 60.0         # сколько держать простаивающее соединение, с
+    dns_ttl: int = 300              # кэш DNS, с
+    connect_timeout: float = 5.0
+    request_timeout: float = 30.0   # на весь запрос
+    prewarm: int = 2                # сколько соединений открыть при старте
+
+
+class PooledBot(Bot):
+    """Bot с настроенным пулом aiohttp-соединений и прогревом при старте."""
+
+    def __init__(self, token: str, pool: PoolSettings = PoolSettings(),
+                 api_url: Optional[str] = None, **kwargs):
+        if api_url:
+            kwargs["server"] = TelegramAPIServer.from_base(api_url)
+        super().__init__(
+            token,
+            connections_limit=pool.size,
+            timeout=aiohttp.ClientTimeout(total=pool.request_timeout,
+                                          connect=pool.connect_timeout),
+            **kwargs,
+        )
+        self.pool = pool
+        self._connector_init.update(
+            limit_per_host=pool.size,
+            keepalive_timeout=pool.keepalive,
+            use_dns_cache=True,
+            ttl_dns_cache=pool.dns_ttl,
+            enable_cleanup_closed=True,
+        )
+
+    async def prewarm(self, connections: Optional[int] = None):
+        """Открывает соединения заранее (TCP + TLS), чтобы первый
+        пользователь после холодного старта не ждал рукопожатий."""
+        connections = self.pool.prewarm if connections is None else connections
+        if connections <= 0:
+            return
+        results = await asyncio.gather(
+            *(self.get_me() for _ in range(connections)), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            logging.warning("⚠️ ПРОГРЕВ ПУЛА: %s ошибок (%s)", len(errors), errors[0])
+        else:
+            logging.info("🔥 ПУЛ СОЕДИНЕНИЙ ПРОГРЕТ: %s", connections)
+
+    async def close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # даём aiohttp закрыть SSL-транспорты
+            await asyncio.sleep(0.25)
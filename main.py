@@ -1,23 +1,51 @@
 import logging
 import os
 import asyncio
+import hmac
 import json
-import re
 import time
+from datetime import datetime, timezone
+
+_import_started = time.perf_counter()   # для профиля холодного старта в /ready
+
+try:                                  # orjson заметно быстрее, но необязателен
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 from aiogram import Bot, Dispatcher, types
 from aiogram.types import (
     ReplyKeyboardMarkup, KeyboardButton,
     InlineKeyboardMarkup, InlineKeyboardButton
 )
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.dispatcher.filters import Text
 
 from dotenv import load_dotenv
+import aiohttp
 from aiohttp import web
 
+from applications import (
+    ApplicationStore, Filter, csv_chunk, csv_header, jsonl_chunk, normalize_phone,
+)
+from dedup import UpdateDeduplicator
+from faq import FaqRegistry
+from fsm_storage import SessionStorage, SQLiteStorage
+from http_pool import PoolSettings, PooledBot
+import metrics
+from metrics import MetricsBot, MetricsMiddleware
+from outbox import AdminOutbox
+from polling import PollingFallback
+from scheduler import (
+    OutboundScheduler, ScheduledBot, PRIORITY_ADMIN, PRIORITY_BACKGROUND,
+    priority, send_priority,
+)
+from replies import Step, send_step, show_step
+import routing
+from throttling import ThrottlingMiddleware, parse_limits, throttle
+from update_queue import UpdateQueue
+
 # ──────────────────────────────────────────────────────────────
 load_dotenv()
 
@@ -38,14 +66,101 @@ logging.basicConfig(
 
 WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "https://maral-bot.onrender.com")
 WEBHOOK_PATH = "/webhook"
-WEBAPP_HOST  = "0.0.0.0"
+WEBAPP_HOST  = os.getenv("WEBAPP_HOST", "0.0.0.0")
 WEBAPP_PORT  = int(os.getenv("PORT", 10000))
 WEBHOOK_URL  = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
+# в многопроцессном режиме (supervisor.py) вебхуком управляет только воркер 0
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1") == "1"
+
+# здоровье вебхука и резервный приём через getUpdates
+WEBHOOK_CHECK_INTERVAL = float(os.getenv("WEBHOOK_CHECK_INTERVAL", 30))
+WEBHOOK_FAIL_CHECKS    = int(os.getenv("WEBHOOK_FAIL_CHECKS", 2))      # подряд плохих проверок до перехода
+WEBHOOK_RETRY_INTERVAL = float(os.getenv("WEBHOOK_RETRY_INTERVAL", 300))  # как часто пробовать вернуть вебхук
+POLL_FALLBACK    = os.getenv("POLL_FALLBACK", "1") == "1"
+POLL_LIMIT       = int(os.getenv("POLL_LIMIT", 100))
+POLL_TIMEOUT     = int(os.getenv("POLL_TIMEOUT", 25))
+POLL_FORWARD_URL = os.getenv("POLL_FORWARD_URL")   # supervisor.py: отдавать апдейты фронту
+
+# 1 — сервер принимает запросы сразу, вебхук и прогрев идут в фоне (см. /ready);
+# 0 — как раньше, порт открывается только после установки вебхука
+FAST_START = os.getenv("FAST_START", "1") == "1"
+
+# остановка: сколько ждать обработки очереди и отправок; вебхук по умолчанию
+# остаётся на месте, чтобы апдейты во время редеплоя дождались нового экземпляра
+SHUTDOWN_TIMEOUT           = float(os.getenv("SHUTDOWN_TIMEOUT", 20))
+WEBHOOK_DELETE_ON_SHUTDOWN = os.getenv("WEBHOOK_DELETE_ON_SHUTDOWN", "0") == "1"
 
 ALLOWED_CHATS = {ADMIN_CHAT_ID}
 
-bot = Bot(token=TOKEN)
-dp  = Dispatcher(bot, storage=MemoryStorage())
+# локальные файлы бота (SQLite и т.п.)
+DATA_DIR = os.getenv("DATA_DIR", ".")
+
+# FSM: sqlite — переживает рестарты, memory — как раньше
+FSM_STORAGE        = os.getenv("FSM_STORAGE", "sqlite")
+FSM_DB_PATH        = os.getenv("FSM_DB_PATH", os.path.join(DATA_DIR, "fsm.sqlite3"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 1))
+FSM_TTL            = float(os.getenv("FSM_TTL", 86400))   # брошенная форма живёт сутки; 0 — вечно
+
+# заявки админу: сначала на диск, доставка фоном пачками
+OUTBOX_DB_PATH      = os.getenv("OUTBOX_DB_PATH", os.path.join(DATA_DIR, "outbox.sqlite3"))
+OUTBOX_BATCH_WINDOW = float(os.getenv("OUTBOX_BATCH_WINDOW", 2))
+
+# журнал заявок и его выгрузка; без ADMIN_API_TOKEN выгрузка выключена
+APPLICATIONS_DB_PATH = os.getenv("APPLICATIONS_DB_PATH", os.path.join(DATA_DIR, "applications.sqlite3"))
+ADMIN_API_TOKEN      = os.getenv("ADMIN_API_TOKEN")
+
+# лимиты Telegram на исходящие сообщения
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", 30))
+TG_CHAT_RATE   = float(os.getenv("TG_CHAT_RATE", 1))
+TG_CHAT_BURST  = float(os.getenv("TG_CHAT_BURST", 3))
+
+# пул HTTP-соединений к Bot API
+TG_API_URL = os.getenv("TG_API_URL")          # свой Bot API сервер / заглушка для тестов
+TG_POOL = PoolSettings(
+    size=int(os.getenv("TG_POOL_SIZE", 20)),
+    keepalive=float(os.getenv("TG_KEEPALIVE", 60)),
+    dns_ttl=int(os.getenv("TG_DNS_TTL", 300)),
+    connect_timeout=float(os.getenv("TG_CONNECT_TIMEOUT", 5)),
+    request_timeout=float(os.getenv("TG_REQUEST_TIMEOUT", 30)),
+    prewarm=int(os.getenv("TG_PREWARM", 2)),
+)
+
+# сколько апдейтов разных чатов обрабатывается одновременно (апдейты одного
+# чата — всегда по очереди); 0 — апдейт обрабатывается прямо в webhook_handler
+UPDATE_WORKERS      = int(os.getenv("UPDATE_WORKERS", 64))
+UPDATE_QUEUE_SIZE   = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+UPDATE_PUT_TIMEOUT  = float(os.getenv("UPDATE_PUT_TIMEOUT", 5))
+
+# FAQ: тексты и клавиатуры во внешнем файле, перечитываются без редеплоя
+FAQ_PATH            = os.getenv("FAQ_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.json"))
+FAQ_RELOAD_INTERVAL = float(os.getenv("FAQ_RELOAD_INTERVAL", 30))
+
+# кэш update_id для отсечения повторных доставок от Telegram
+DEDUP_SIZE = int(os.getenv("DEDUP_SIZE", 10000))
+DEDUP_TTL  = float(os.getenv("DEDUP_TTL", 3600))
+
+# антифлуд: «группа=нажатий/секунд»; группа хендлера задаётся @throttle(...)
+THROTTLE_LIMITS = parse_limits(os.getenv(
+    "THROTTLE_LIMITS", "default=30/60,faq=20/60,search=10/60,form=3/600"))
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", 100000))
+
+if FSM_STORAGE == "sqlite":
+    storage = SQLiteStorage(FSM_DB_PATH, flush_interval=FSM_FLUSH_INTERVAL, ttl=FSM_TTL)
+else:
+    storage = SessionStorage(ttl=FSM_TTL)
+
+class MaralBot(ScheduledBot, MetricsBot, PooledBot):
+    """Планировщик отправок поверх настроенного пула соединений.
+
+    MetricsBot стоит под планировщиком и замеряет сам HTTP-вызов, без
+    времени ожидания в очереди отправок.
+    """
+
+bot = MaralBot(token=TOKEN, pool=TG_POOL, api_url=TG_API_URL)
+bot.scheduler = OutboundScheduler(
+    global_rate=TG_GLOBAL_RATE, chat_rate=TG_CHAT_RATE, chat_burst=TG_CHAT_BURST,
+)
+dp  = Dispatcher(bot, storage=storage)
 Bot.set_current(bot)          # важно для хендлеров
 
 async def safe_send(chat_id: int, text: str, **kwargs):
@@ -53,6 +168,14 @@ async def safe_send(chat_id: int, text: str, **kwargs):
     if chat_id in ALLOWED_CHATS:
         await bot.send_message(chat_id, text, **kwargs)
 
+async def send_to_admin(text: str, parse_mode=None):
+    with priority(PRIORITY_ADMIN):
+        await safe_send(ADMIN_CHAT_ID, text, parse_mode=parse_mode,
+                        disable_web_page_preview=True)
+
+outbox = AdminOutbox(OUTBOX_DB_PATH, send_to_admin, batch_window=OUTBOX_BATCH_WINDOW)
+applications = ApplicationStore(APPLICATIONS_DB_PATH)
+
 async def set_webhook_with_retry(bot: Bot, url: str,
                                  attempts: int = 5, delay: int = 5):
     """Ставит веб-хук, повторяя попытку при ошибке."""
@@ -67,17 +190,53 @@ async def set_webhook_with_retry(bot: Bot, url: str,
     logging.critical("‼️ не удалось поставить WEBHOOK")
     return False
 
-async def webhook_monitor(bot: Bot, url: str, interval: int = 60):
-    """Следит, чтобы веб-хук не слетел; при необходимости восстанавливает."""
+def webhook_healthy(info: types.WebhookInfo, url: str, window: float) -> bool:
+    """Вебхук стоит и Telegram недавно не жаловался на доставку при очереди апдейтов."""
+    if info.url != url:
+        return False
+    if not info.pending_update_count or not info.last_error_date:
+        return True
+    return time.time() - info.last_error_date > window
+
+async def return_to_webhook(bot: Bot, url: str):
+    """Выключает опрос (с подтверждением offset) и снова ставит вебхук."""
+    await polling.stop()
+    try:
+        await bot.set_webhook(url, secret_token=WEBHOOK_SECRET)
+        logging.info("🚀 WEBHOOK восстановлен, опрос выключен")
+    except Exception as e:
+        logging.error("❌ WEBHOOK всё ещё не ставится: %s", e)
+        await polling.start()
+
+async def webhook_monitor(bot: Bot, url: str, interval: float = 60):
+    """Следит, чтобы веб-хук не слетел; при необходимости восстанавливает.
+
+    Если вебхук плох WEBHOOK_FAIL_CHECKS проверок подряд, апдейты начинают
+    забираться через getUpdates; раз в WEBHOOK_RETRY_INTERVAL пробуем вернуться.
+    """
+    send_priority.set(PRIORITY_BACKGROUND)
+    failures = 0
     while True:
         try:
-            info = await bot.get_webhook_info()
-            if info.url != url:
-                logging.warning("⚠️ WEBHOOK сброшен, восстанавливаю…")
-                await bot.set_webhook(url, secret_token=WEBHOOK_SECRET)
-                logging.info("🚀 WEBHOOK восстановлен")
+            if polling.active:
+                if time.monotonic() - polling.active_since >= WEBHOOK_RETRY_INTERVAL:
+                    await return_to_webhook(bot, url)
+            else:
+                info = await bot.get_webhook_info()
+                if info.url != url:
+                    logging.warning("⚠️ WEBHOOK сброшен, восстанавливаю…")
+                    await bot.set_webhook(url, secret_token=WEBHOOK_SECRET)
+                    logging.info("🚀 WEBHOOK восстановлен")
+                failures = 0 if webhook_healthy(info, url, interval * 2) else failures + 1
         except Exception as e:
             logging.error("❌ ошибка монитора WEBHOOK: %s", e)
+            failures += 1
+        if POLL_FALLBACK and not polling.active and failures >= WEBHOOK_FAIL_CHECKS:
+            failures = 0
+            try:
+                await polling.start()
+            except Exception as e:
+                logging.error("❌ не удалось включить getUpdates: %s", e)
         await asyncio.sleep(interval)
 
 class RequestForm(StatesGroup):
@@ -86,16 +245,43 @@ class RequestForm(StatesGroup):
     waiting_for_phone   = State()
     waiting_for_question = State()
 
+faq = FaqRegistry(FAQ_PATH)
+faq.load()
+
 main_kb = ReplyKeyboardMarkup(resize_keyboard=True)
 main_kb.add(
     KeyboardButton("📄 Жиі қойылатын сұрақтар"),
     KeyboardButton("📝 Өтінім қалдыру")
 )
 
+# ========== ШАГИ ФОРМЫ ==========
+# Каждый шаг — одно сообщение: кнопка «назад» либо прикреплена inline к
+# вопросу, либо живёт в reply-клавиатуре шага.
+BACK_BUTTON = "⬅️ Алдыңғы қадам"
+
+_to_main_kb = InlineKeyboardMarkup()
+_to_main_kb.add(InlineKeyboardButton("⬅️ Басты мәзірге", callback_data="back_to_main"))
+
+_phone_kb = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+_phone_kb.add(KeyboardButton("📲 Нөмірімді жіберу", request_contact=True))
+_phone_kb.add(KeyboardButton("✍️ Өзім жазамын"))
+_phone_kb.add(KeyboardButton(BACK_BUTTON))
+
+_back_only_kb = ReplyKeyboardMarkup(resize_keyboard=True)
+_back_only_kb.add(KeyboardButton(BACK_BUTTON))
+
+NAME_STEP = Step("📛 Атыңызды жазыңыз:", back=_to_main_kb)
+PHONE_STEP = Step("📞 Телефон нөміріңізді жіберіңіз немесе түймені басыңыз:",
+                  reply_markup=_phone_kb)
+MANUAL_PHONE_STEP = Step("📝 Телефон нөміріңізді жазыңыз:\n"
+                         "_Мысалы: +7 (777) 123-45-67_",
+                         parse_mode="Markdown", reply_markup=_back_only_kb)
+QUESTION_STEP = Step("📝 Сұрағыңызды толық сипаттап жазыңыз:", reply_markup=_back_only_kb)
+
 # START
 @dp.message_handler(commands=['start'], state='*')
 async def send_welcome(message: types.Message, state: FSMContext):
-    logging.info(f"🟢 START КОМАНДА ОТ ПОЛЬЗОВАТЕЛЯ {message.from_user.id}")
+    logging.info("🟢 START КОМАНДА ОТ ПОЛЬЗОВАТЕЛЯ %s", message.from_user.id)
     await state.finish()
     await message.answer(
         "🎓 *ӘДІСТЕМЕЛІК КӨМЕК БОТЫ*\n"
@@ -121,72 +307,73 @@ async def send_welcome(message: types.Message, state: FSMContext):
 
 @dp.message_handler(Text(equals="📝 Өтінім қалдыру"), state='*')
 async def start_request(message: types.Message, state: FSMContext):
-    logging.info(f"🟡 ЗАЯВКА НАЧАТА ПОЛЬЗОВАТЕЛЕМ {message.from_user.id}")
+    logging.info("🟡 ЗАЯВКА НАЧАТА ПОЛЬЗОВАТЕЛЕМ %s", message.from_user.id)
     await state.finish()
-    await message.answer("📛 Атыңызды жазыңыз:")
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Басты мәзірге", callback_data="back_to_main"))
-    await message.answer("_Басты мәзірге оралу үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await send_step(message, NAME_STEP)
     await RequestForm.waiting_for_name.set()
 
+# После возврата с шага телефона у клиента остаётся reply-клавиатура с
+# кнопкой «назад»: на шаге имени она ведёт туда же, куда inline-кнопка, —
+# в главное меню, и заодно заменяет устаревшую клавиатуру.
+@dp.message_handler(Text(equals=BACK_BUTTON), state=RequestForm.waiting_for_name)
+async def back_to_main_text(message: types.Message, state: FSMContext):
+    await state.finish()
+    await message.answer("Басты мәзір:", reply_markup=main_kb)
+
 @dp.message_handler(state=RequestForm.waiting_for_name)
 async def get_name(message: types.Message, state: FSMContext):
-    logging.info(f"🟡 ИМЯ ПОЛУЧЕНО: {message.text}")
+    logging.info("🟡 ИМЯ ПОЛУЧЕНО: %s", message.text)
     await state.update_data(name=message.text)
-    kb = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    kb.add(KeyboardButton("📲 Нөмірімді жіберу", request_contact=True))
-    kb.add(KeyboardButton("✍️ Өзім жазамын"))
-    await message.answer("📞 Телефон нөміріңізді жіберіңіз немесе түймені басыңыз:", reply_markup=kb)
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Алдыңғы қадам", callback_data="back_to_name_prev"))
-    await message.answer("_Артқа қайту үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await send_step(message, PHONE_STEP)
     await RequestForm.waiting_for_phone.set()
 
 @dp.message_handler(Text(equals="✍️ Өзім жазамын"), state=RequestForm.waiting_for_phone)
 async def manual_phone_entry(message: types.Message, state: FSMContext):
-    logging.info(f"🟡 РУЧНОЙ ВВОД ТЕЛЕФОНА ВЫБРАН: пользователь {message.from_user.id}")
-    await message.answer(
-        "📝 Телефон нөміріңізді жазыңыз:\n"
-        "_Мысалы: +7 (777) 123-45-67_",
-        parse_mode="Markdown",
-        reply_markup=types.ReplyKeyboardRemove()
-    )
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Алдыңғы қадам", callback_data="back_to_name_prev"))
-    await message.answer("_Артқа қайту үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    logging.info("🟡 РУЧНОЙ ВВОД ТЕЛЕФОНА ВЫБРАН: пользователь %s", message.from_user.id)
+    await send_step(message, MANUAL_PHONE_STEP)
+
+@dp.message_handler(Text(equals=BACK_BUTTON), state=RequestForm.waiting_for_phone)
+async def back_to_name_text(message: types.Message, state: FSMContext):
+    await send_step(message, NAME_STEP)
+    await RequestForm.waiting_for_name.set()
+
+@dp.message_handler(Text(equals=BACK_BUTTON), state=RequestForm.waiting_for_question)
+async def back_to_phone_text(message: types.Message, state: FSMContext):
+    await send_step(message, PHONE_STEP)
+    await RequestForm.waiting_for_phone.set()
 
 @dp.message_handler(content_types=types.ContentType.CONTACT, state=RequestForm.waiting_for_phone)
 async def get_phone_contact(message: types.Message, state: FSMContext):
-    logging.info(f"🟡 КОНТАКТ ПОЛУЧЕН: {message.contact.phone_number}")
+    logging.info("🟡 КОНТАКТ ПОЛУЧЕН: %s", message.contact.phone_number)
     await state.update_data(phone=message.contact.phone_number)
-    await message.answer("📝 Сұрағыңызды толық сипаттап жазыңыз:", reply_markup=types.ReplyKeyboardRemove())
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Алдыңғы қадам", callback_data="back_to_phone_prev"))
-    await message.answer("_Артқа қайту үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await send_step(message, QUESTION_STEP)
     await RequestForm.waiting_for_question.set()
 
 @dp.message_handler(state=RequestForm.waiting_for_phone)
 async def get_phone_text(message: types.Message, state: FSMContext):
     if message.text == "✍️ Өзім жазамын":
         return
-    logging.info(f"🟡 ТЕЛЕФОН ТЕКСТОМ: {message.text}")
+    logging.info("🟡 ТЕЛЕФОН ТЕКСТОМ: %s", message.text)
     await state.update_data(phone=message.text)
-    await message.answer("📝 Сұрағыңызды толық сипаттап жазыңыз:", reply_markup=types.ReplyKeyboardRemove())
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Алдыңғы қадам", callback_data="back_to_phone_prev"))
-    await message.answer("_Артқа қайту үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await send_step(message, QUESTION_STEP)
     await RequestForm.waiting_for_question.set()
 
 @dp.message_handler(state=RequestForm.waiting_for_question)
+@throttle("form")
 async def get_question(message: types.Message, state: FSMContext):
-    logging.info(f"🟡 ВОПРОС ПОЛУЧЕН ОТ {message.from_user.id}: {message.text}")
+    logging.info("🟡 ВОПРОС ПОЛУЧЕН ОТ %s: %s", message.from_user.id, message.text)
     try:
         user_data = await state.get_data()
         name = user_data.get('name', 'Не указано')
         phone = user_data.get('phone', 'Не указано')
         question = message.text
-        logging.info(f"🟡 ДАННЫЕ: имя={name}, телефон={phone}")
-        wa_phone = re.sub(r'[^\d]', '', phone)
+        logging.info("🟡 ДАННЫЕ: имя=%s, телефон=%s", name, phone)
+        wa_phone = normalize_phone(phone)
+        try:
+            await applications.add(message.from_user.id, message.chat.id, name, phone, question)
+        except Exception as e:
+            # журнал — для отчётов; заявка всё равно уходит админу
+            logging.error("❌ ОШИБКА ЗАПИСИ ЗАЯВКИ В ЖУРНАЛ: %s", e)
         admin_text = (
             f"📥 *Жаңа өтінім!*\n\n"
             f"👤 *Аты:* {name}\n"
@@ -195,15 +382,12 @@ async def get_question(message: types.Message, state: FSMContext):
             f"📱 [WhatsApp-қа өту](https://wa.me/{wa_phone})"
         )
         try:
-            await bot.send_message(
-                chat_id=ADMIN_CHAT_ID, 
-                text=admin_text, 
-                parse_mode="Markdown",
-                disable_web_page_preview=True
-            )
-            logging.info(f"✅ СООБЩЕНИЕ ОТПРАВЛЕНО АДМИНУ {ADMIN_CHAT_ID}")
+            await outbox.put(admin_text)
+            logging.info("📮 ЗАЯВКА ПОСТАВЛЕНА В ОЧЕРЕДЬ АДМИНУ %s", ADMIN_CHAT_ID)
         except Exception as e:
-            logging.error(f"❌ ОШИБКА ОТПРАВКИ АДМИНУ: {e}")
+            # диск недоступен — пробуем отправить сразу, как раньше
+            logging.error("❌ ОШИБКА ЗАПИСИ В OUTBOX: %s", e)
+            await send_to_admin(admin_text, parse_mode="Markdown")
         await message.answer(
             "✅ *Рақмет!*\n\n"
             "Сіздің өтінішіңіз қабылданды және маманға жіберілді.\n"
@@ -212,9 +396,9 @@ async def get_question(message: types.Message, state: FSMContext):
             parse_mode="Markdown",
             reply_markup=main_kb
         )
-        logging.info(f"✅ ЗАЯВКА ЗАВЕРШЕНА ДЛЯ {message.from_user.id}")
+        logging.info("✅ ЗАЯВКА ЗАВЕРШЕНА ДЛЯ %s", message.from_user.id)
     except Exception as e:
-        logging.error(f"❌ ОШИБКА В get_question: {e}")
+        logging.error("❌ ОШИБКА В get_question: %s", e)
         await message.answer(
             "❌ Қате пайда болды. Қайта көріңіз немесе /start басыңыз.",
             reply_markup=main_kb
@@ -237,137 +421,43 @@ async def back_to_main_menu(callback_query: types.CallbackQuery, state: FSMConte
 
 @dp.callback_query_handler(Text(equals="back_to_name_prev"), state=RequestForm.waiting_for_phone)
 async def back_to_name_step(callback_query: types.CallbackQuery, state: FSMContext):
-    try:
-        await callback_query.message.edit_reply_markup(reply_markup=None)
-    except Exception:
-        pass
     await callback_query.answer("Алдыңғы қадамға оралдыңыз")
     await RequestForm.waiting_for_name.set()
-    await callback_query.message.answer("📛 Атыңызды жазыңыз:")
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Басты мәзірге", callback_data="back_to_main"))
-    await callback_query.message.answer("_Басты мәзірге оралу үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await show_step(callback_query, NAME_STEP)
 
 @dp.callback_query_handler(Text(equals="back_to_phone_prev"), state=RequestForm.waiting_for_question)
 async def back_to_phone_step(callback_query: types.CallbackQuery, state: FSMContext):
-    try:
-        await callback_query.message.edit_reply_markup(reply_markup=None)
-    except Exception:
-        pass
     await callback_query.answer("Алдыңғы қадамға оралдыңыз")
     await RequestForm.waiting_for_phone.set()
-    kb = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    kb.add(KeyboardButton("📲 Нөмірімді жіберу", request_contact=True))
-    kb.add(KeyboardButton("✍️ Өзім жазамын"))
-    await callback_query.message.answer("📞 Телефон нөміріңізді жіберіңіз немесе түймені басыңыз:", reply_markup=kb)
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Алдыңғы қадам", callback_data="back_to_name_prev"))
-    await callback_query.message.answer("_Артқа қайту үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await show_step(callback_query, PHONE_STEP)
 
 @dp.message_handler(Text(equals="📄 Жиі қойылатын сұрақтар"), state='*')
+@throttle("faq")
 async def show_faq_categories(message: types.Message, state: FSMContext):
-    logging.info(f"🔵 FAQ ЗАПРОШЕН ПОЛЬЗОВАТЕЛЕМ {message.from_user.id}")
+    logging.info("🔵 FAQ ЗАПРОШЕН ПОЛЬЗОВАТЕЛЕМ %s", message.from_user.id)
     await state.finish()
-    kb = InlineKeyboardMarkup(row_width=2)
-    kb.add(
-        InlineKeyboardButton("📚 Пән бойынша", callback_data="faq_subjects"),
-        InlineKeyboardButton("📝 Бағалау / Сабақ", callback_data="faq_assessment"),
-        InlineKeyboardButton("📎 Басқару / Мақала", callback_data="faq_docs"),
-        InlineKeyboardButton("💬 Психология / Курс", callback_data="faq_psy"),
-        InlineKeyboardButton("🧾 Анықтама / Ашық сабақ", callback_data="faq_cert"),
-        InlineKeyboardButton("🎯 Сайыс / Авторлық", callback_data="faq_other")
-    )
-    await message.answer("🤔 Қай бөлім бойынша сұрағыңыз бар?", reply_markup=kb)
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Басты мәзірге", callback_data="faq_back_to_main"))
-    await message.answer("_Басты мәзірге оралу үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    await send_step(message, faq.snapshot.menu)
 
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith("faq_"), state='*')
+@throttle("faq")
 async def show_faq_detail(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"🔵 FAQ CALLBACK: {callback_query.data}")
+    logging.info("🔵 FAQ CALLBACK: %s", callback_query.data)
     await state.finish()
-    try:
-        await callback_query.message.edit_reply_markup(reply_markup=None)
-    except Exception:
-        pass
     if callback_query.data == "faq_back_to_main":
+        try:
+            await callback_query.message.edit_reply_markup(reply_markup=None)
+        except Exception:
+            pass
         await callback_query.answer("Басты мәзірге оралдыңыз ✅")
         await callback_query.message.answer("Басты мәзір:", reply_markup=main_kb)
         return
-    elif callback_query.data == "faq_back_to_categories":
+    snapshot = faq.snapshot
+    step = snapshot.pages.get(callback_query.data, snapshot.not_found)
+    if step is snapshot.menu:
         await callback_query.answer("Категорияларға оралдыңыз")
-        kb = InlineKeyboardMarkup(row_width=2)
-        kb.add(
-            InlineKeyboardButton("📚 Пән бойынша", callback_data="faq_subjects"),
-            InlineKeyboardButton("📝 Бағалау / Сабақ", callback_data="faq_assessment"),
-            InlineKeyboardButton("📎 Басқару / Мақала", callback_data="faq_docs"),
-            InlineKeyboardButton("💬 Психология / Курс", callback_data="faq_psy"),
-            InlineKeyboardButton("🧾 Анықтама / Ашық сабақ", callback_data="faq_cert"),
-            InlineKeyboardButton("🎯 Сайыс / Авторлық", callback_data="faq_other")
-        )
-        await callback_query.message.answer("🤔 Қай бөлім бойынша сұрағыңыз бар?", reply_markup=kb)
-        back_kb = InlineKeyboardMarkup()
-        back_kb.add(InlineKeyboardButton("⬅️ Басты мәзірге", callback_data="faq_back_to_main"))
-        await callback_query.message.answer("_Басты мәзірге оралу үшін:_", parse_mode="Markdown", reply_markup=back_kb)
-        return
-    faq_data = {
-        "faq_subjects": (
-            "📚 *Пән бойынша сұрақтар:*\n\n"
-            "• *Математика* - есептеу дағдылары, логикалық тапсырмалар\n"
-            "• *Қазақ тілі* - грамматика, орфография, сөйлеу дағдылары\n"
-            "• *Әдебиеттік оқу* - мәнерлеп оқу, мәтінмен жұмыс\n"
-            "• *Жаратылыстану* - зерттеу жұмыстары, тәжірибелер\n"
-            "• *Дүниетану* - жобалық жұмыстар, презентациялар\n"
-            "• *Әліппе* - дыбыстық талдау, жазу дағдылары"
-        ),
-        "faq_assessment": (
-            "📝 *Бағалау мен сабақ жоспары:*\n\n"
-            "• *Сабақ құрылымы* - кезеңдері, уақытты бөлу\n"
-            "• *Қалыптастырушы бағалау* - әдістері, құралдары\n"
-            "• *Жиынтық бағалау* - БЖБ, ТЖБ өткізу\n"
-            "• *Кері байланыс* - тиімді әдістері\n"
-            "• *Дескрипторлар* - құрастыру жолдары\n"
-            "• *Кеңейтілген дағдылар* - енгізу тәсілдері"
-        ),
-        "faq_docs": (
-            "📎 *Құжаттар / Мақала / Басқару:*\n\n"
-            "• *Сыныпты басқару* - тәртіп, мотивация\n"
-            "• *Құжат жүргізу* - журнал, жоспарлар\n"
-            "• *Мақала жариялау* - республикалық басылымдар\n"
-            "• *Ата-аналармен жұмыс* - кеңестер, жиналыстар\n"
-            "• *Портфолио* - дайындау, рәсімдеу"
-        ),
-        "faq_psy": (
-            "💬 *Психологиялық тренингтер мен курс:*\n\n"
-            "• *Балалармен тренингтер* - өзін-өзі тану, достық\n"
-            "• *Ата-аналарға арналған* - тәрбие, қарым-қатынас\n"
-            "• *Мұғалімдерге* - кәсіби қиындықтардын алдын алу\n"
-            "• *Курстар* - біліктілікті арттыру\n"
-            "• *Семинарлар* - заманауи әдістер"
-        ),
-        "faq_cert": (
-            "🧾 *Анықтама / Ашық сабақ:*\n\n"
-            "• *Ашық сабақ* - дайындық, өткізу кезеңдері\n"
-            "• *Сабақ талдау* - өзін-өзі талдау схемасы\n"
-            "• *Анықтама алу* - қажетті құжаттар\n"
-            "• *Мінездеме* - жазу үлгілері\n"
-            "• *Грамота, алғыс хат* - рәсімдеу"
-        ),
-        "faq_other": (
-            "🎯 *Сайыс / Авторлық бағдарлама:*\n\n"
-            "• *Педагогикалық идеялар* - 'Үздік педагог', 'педагогикалық идеялар панорамасы' сайысы\n"
-            "• *Авторлық бағдарлама* - құрастыру, қорғау\n"
-            "• *Аттестация* - дайындық, құжаттар\n"
-            "• *Ғылыми жобалар* - оқушылармен жұмыс\n"
-            "• *Инновациялық әдістер* - енгізу тәжірибесі"
-        )
-    }
-    text = faq_data.get(callback_query.data, "Кешіріңіз, ақпарат табылмады.")
-    await callback_query.answer("Ақпарат жүктелді ✅")
-    await callback_query.message.answer(text, parse_mode="Markdown")
-    back_kb = InlineKeyboardMarkup()
-    back_kb.add(InlineKeyboardButton("⬅️ Категорияларға", callback_data="faq_back_to_categories"))
-    await callback_query.message.answer("_Артқа қайту үшін:_", parse_mode="Markdown", reply_markup=back_kb)
+    else:
+        await callback_query.answer("Ақпарат жүктелді ✅")
+    await show_step(callback_query, step)
 
 @dp.message_handler(commands=['ping'])
 async def ping_handler(message: types.Message):
@@ -388,8 +478,9 @@ async def reset_bot(message: types.Message, state: FSMContext):
     )
 
 @dp.message_handler(state='*')
+@throttle("search")
 async def fallback_handler(message: types.Message, state: FSMContext):
-    logging.info(f"🔴 FALLBACK: {message.text} от {message.from_user.id}")
+    logging.info("🔴 FALLBACK: %s от %s", message.text, message.from_user.id)
     current_state = await state.get_state()
     if current_state:
         await message.answer(
@@ -397,6 +488,11 @@ async def fallback_handler(message: types.Message, state: FSMContext):
             "Басты мәзірге оралу үшін /start басыңыз немесе процесті жалғастырыңыз.",
             reply_markup=main_kb
         )
+        return
+    # свободный текст — возможно, ответ уже есть в FAQ
+    step = faq.snapshot.search(message.text) if message.text else None
+    if step:
+        await send_step(message, step)
     else:
         await message.answer(
             "❓ Түсініксіз команда.\n"
@@ -406,12 +502,12 @@ async def fallback_handler(message: types.Message, state: FSMContext):
 
 @dp.callback_query_handler(lambda c: True, state='*')
 async def handle_unknown_callback(callback_query: types.CallbackQuery, state: FSMContext):
-    logging.info(f"🔴 UNKNOWN CALLBACK: {callback_query.data}")
+    logging.info("🔴 UNKNOWN CALLBACK: %s", callback_query.data)
     await callback_query.answer("Белгісіз команда. Қайта көріңіз.", show_alert=True)
 
 @dp.errors_handler()
 async def global_error_handler(update, exception):
-    logging.error(f"❌ ГЛОБАЛЬНАЯ ОШИБКА в update {update}: {exception}")
+    logging.error("❌ ГЛОБАЛЬНАЯ ОШИБКА в update %s: %s", update, exception)
     try:
         if update.message:
             await update.message.answer(
@@ -422,8 +518,162 @@ async def global_error_handler(update, exception):
         pass
     return True
 
+# ========== МАРШРУТИЗАЦИЯ ==========
+# точные совпадения по тексту кнопок и callback_data — одним поиском в таблице
+message_routes, callback_routes = routing.install(dp)
+
+# ========== АНТИФЛУД ==========
+# раньше метрик: отброшенный апдейт не попадает во время хендлеров
+throttling = ThrottlingMiddleware(THROTTLE_LIMITS, max_entries=THROTTLE_MAX_USERS)
+dp.middleware.setup(throttling)
+
+# ========== МЕТРИКИ ==========
+# после регистрации хендлеров: middleware заранее создаёт серии для каждого
+dp.middleware.setup(MetricsMiddleware(dp))
+
+def fsm_sessions():
+    counts = metrics.fsm_state_counts(storage)
+    return {state: counts.get(state, 0) for state in RequestForm.all_states_names}
+
+metrics.registry.add(metrics.Gauge(
+    "maral_fsm_sessions", "Сессии по состояниям формы заявки", fsm_sessions, labels=("state",),
+))
+metrics.registry.add(metrics.Gauge(
+    "maral_fsm_memory_bytes", "Оценка памяти, занятой сессиями FSM",
+    lambda: {(): storage.stats()["memory_bytes"]},
+))
+metrics.registry.add(metrics.Gauge(
+    "maral_update_queue_depth", "Апдейтов в очереди воркеров",
+    lambda: {(): update_queue.depth()},
+))
+metrics.registry.add(metrics.Gauge(
+    "maral_outbound_queued", "Исходящих вызовов в очереди планировщика",
+    lambda: {(): bot.scheduler.stats()["queued"]},
+))
+metrics.registry.add(metrics.Gauge(
+    "maral_polling_active", "Апдейты забираются через getUpdates вместо вебхука",
+    lambda: {(): int(polling.active)},
+))
+metrics.registry.add(metrics.Gauge(
+    "maral_throttle_tracked", "Окон антифлуда в памяти (пользователь × группа)",
+    lambda: {(): throttling.stats()["tracked"]},
+))
+
+# ========== ОЧЕРЕДЬ АПДЕЙТОВ ==========
+def update_chat_key(update: types.Update):
+    """Ключ шардирования: id чата, иначе id пользователя, иначе update_id."""
+    if update.message:
+        return update.message.chat.id
+    if update.callback_query:
+        if update.callback_query.message:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    if update.edited_message:
+        return update.edited_message.chat.id
+    return update.update_id
+
+async def process_update(update: types.Update):
+    Dispatcher.set_current(dp)
+    Bot.set_current(bot)
+    await dp.process_update(update)
+
+update_dedup = UpdateDeduplicator(maxlen=DEDUP_SIZE, ttl=DEDUP_TTL)
+
+update_queue = UpdateQueue(
+    process_update,
+    workers=UPDATE_WORKERS,
+    maxsize=UPDATE_QUEUE_SIZE,
+    put_timeout=UPDATE_PUT_TIMEOUT,
+)
+
 # ========== WEBHOOK HANDLER & PING ==========
-# ========== WEBHOOK HANDLER & PING ==========
+def log_update(update: types.Update):
+    """Подробный лог апдейта — только в DEBUG, чтобы не тратить CPU в проде."""
+    logging.info("✅ UPDATE СОЗДАН: update_id=%s", update.update_id)
+    if update.message:
+        user = update.message.from_user
+        logging.info("📩 СООБЩЕНИЕ ОТ: @%s (ID: %s)", user.username, user.id)
+        logging.info("📝 ТЕКСТ: %s", update.message.text)
+    elif update.callback_query:
+        logging.info("🔘 CALLBACK: %s", update.callback_query.data)
+
+async def ingest(json_data) -> int:
+    """Общий вход апдейта для вебхука и getUpdates: дедупликация, разбор,
+    очередь. Возвращает HTTP-код, который получил бы Telegram."""
+    if not isinstance(json_data, dict):
+        return 400
+
+    # --- Повторная доставка того же апдейта ---
+    if update_dedup.is_duplicate(json_data.get("update_id")):
+        logging.info("♻️ ДУБЛЬ АПДЕЙТА %s ПРОПУЩЕН", json_data.get("update_id"))
+        return 200
+
+    # --- Останавливаемся: Telegram повторит доставку следующему экземпляру ---
+    if readiness["stage"] == "draining":
+        update_dedup.forget(json_data.get("update_id"))
+        return 503
+
+    # --- Создаём Update ---
+    try:
+        update = types.Update(**json_data)
+    except Exception as e:
+        logging.error("❌ ОШИБКА СОЗДАНИЯ UPDATE: %s", e)
+        return 400
+    if DEBUG:
+        log_update(update)
+
+    # --- Быстрый ответ: кладём в очередь, обработают воркеры ---
+    if update_queue.running:
+        try:
+            queued = await update_queue.put(update_chat_key(update), update)
+        except asyncio.CancelledError:
+            # опрос остановили или вебхук-запрос оборвался, пока ждали место:
+            # апдейт не принят, и повторная доставка не должна считаться дублем
+            update_dedup.forget(update.update_id)
+            raise
+        if queued:
+            return 200
+        # очередь забита — пусть Telegram повторит доставку позже
+        update_dedup.forget(update.update_id)
+        return 503
+
+    # --- Передаём диспетчеру ---
+    inline_updates.add(update.update_id)
+    try:
+        Dispatcher.set_current(dp)
+        await dp.process_update(update)
+        logging.info("✅ UPDATE ОБРАБОТАН УСПЕШНО")
+        return 200
+    except Exception as e:
+        logging.error("❌ ОШИБКА ОБРАБОТКИ UPDATE: %s", e)
+        update_dedup.forget(update.update_id)
+        return 500
+    except asyncio.CancelledError:
+        update_dedup.forget(update.update_id)
+        raise
+    finally:
+        inline_updates.discard(update.update_id)
+
+# апдейты, которые сейчас обрабатываются прямо в запросе (UPDATE_WORKERS=0)
+inline_updates = set()
+
+INGEST_REPLIES = {200: "OK", 400: "Invalid update", 500: "Processing error", 503: "Try again later"}
+
+async def forward_update(json_data: dict) -> int:
+    """Многопроцессный режим: апдейт из getUpdates уходит фронту, а тот
+    отдаёт его воркеру, которому принадлежит чат."""
+    session = await bot.get_session()
+    headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET} if WEBHOOK_SECRET else None
+    try:
+        async with session.post(POLL_FORWARD_URL, json=json_data, headers=headers) as response:
+            return response.status
+    except aiohttp.ClientError as e:
+        logging.error("❌ ФРОНТ НЕДОСТУПЕН: %s", e)
+        return 503
+
+polling = PollingFallback(bot, forward_update if POLL_FORWARD_URL else ingest,
+                          limit=POLL_LIMIT, timeout=POLL_TIMEOUT)
+
 async def webhook_handler(request):
     # 🔐 1. ПРОВЕРЯЕМ SECRET-TOKEN ОТ TELEGRAM
     if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
@@ -431,78 +681,230 @@ async def webhook_handler(request):
 
     # 2. Дальше идёт обычная обработка апдейта
     try:
-        body = await request.text()
-        logging.info(f"🔵 WEBHOOK ПОЛУЧЕН: {len(body)} символов")
+        body = await request.read()
+        logging.info("🔵 WEBHOOK ПОЛУЧЕН: %s байт", len(body))
 
         if not body:
             logging.warning("⚠️ ПУСТОЕ ТЕЛО ЗАПРОСА")
             return web.Response(text="Empty body", status=400)
 
-        # --- JSON парсинг ---
+        # --- JSON парсинг (прямо из байтов) ---
         try:
-            json_data = json.loads(body)
-            logging.info("✅ JSON ПАРСИНГ УСПЕШЕН")
-        except json.JSONDecodeError as e:
-            logging.error(f"❌ ОШИБКА ПАРСИНГА JSON: {e}")
+            json_data = json_loads(body)
+        except ValueError as e:
+            logging.error("❌ ОШИБКА ПАРСИНГА JSON: %s", e)
             return web.Response(text="Invalid JSON", status=400)
 
-        # --- Создаём Update ---
-        try:
-            update = types.Update(**json_data)
-            logging.info(
-                f"✅ UPDATE СОЗДАН: update_id={getattr(update, 'update_id', 'нет')}"
-            )
-            if update.message:
-                user = update.message.from_user
-                logging.info(f"📩 СООБЩЕНИЕ ОТ: @{user.username} (ID: {user.id})")
-                logging.info(f"📝 ТЕКСТ: {update.message.text}")
-            elif update.callback_query:
-                logging.info(f"🔘 CALLBACK: {update.callback_query.data}")
-        except Exception as e:
-            logging.error(f"❌ ОШИБКА СОЗДАНИЯ UPDATE: {e}")
-            return web.Response(text="Invalid update", status=400)
-
-        # --- Передаём диспетчеру ---
-        try:
-            Dispatcher.set_current(dp)
-            await dp.process_update(update)
-            logging.info("✅ UPDATE ОБРАБОТАН УСПЕШНО")
-            return web.Response(text="OK")
-        except Exception as e:
-            logging.error(f"❌ ОШИБКА ОБРАБОТКИ UPDATE: {e}")
-            return web.Response(text="Processing error", status=500)
+        status = await ingest(json_data)
+        return web.Response(text=INGEST_REPLIES[status], status=status)
 
     except Exception as e:
-        logging.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА В WEBHOOK: {e}")
+        logging.error("❌ КРИТИЧЕСКАЯ ОШИБКА В WEBHOOK: %s", e)
         return web.Response(text="Internal server error", status=500)
 
 
+@web.middleware
+async def webhook_timing(request, handler):
+    """Время ответа вебхука с разбивкой по коду ответа."""
+    if request.path != WEBHOOK_PATH:
+        return await handler(request)
+    started = time.perf_counter()
+    response = await handler(request)
+    metrics.webhook_seconds.observe(time.perf_counter() - started, response.status)
+    return response
+
 async def ping(request):
     return web.Response(text="pong")
 
+async def ready(request):
+    """Готовность: пул прогрет, вебхук поставлен (или включён опрос).
+
+    /ping отвечает сразу после старта и годится для liveness-проверки.
+    """
+    status = 200 if readiness["stage"] == "ready" else 503
+    return web.json_response(readiness, status=status)
+
+async def metrics_handler(request):
+    return web.Response(text=metrics.registry.render(),
+                        headers={"Content-Type": metrics.CONTENT_TYPE})
+
+async def stats(request):
+    return web.json_response({
+        "update_queue": update_queue.stats(),
+        "dedup": update_dedup.stats(),
+        "outbox": outbox.stats(),
+        "applications": applications.stats(),
+        "outbound": bot.scheduler.stats(),
+        "fsm": storage.stats() if hasattr(storage, "stats") else None,
+        "polling": polling.stats(),
+        "routing": {"message": message_routes.stats(), "callback_query": callback_routes.stats()},
+        "throttling": throttling.stats(),
+    })
+
+# ========== ВЫГРУЗКА ЗАЯВОК ==========
+EXPORT_FORMATS = {
+    "csv": ("text/csv", csv_header(), csv_chunk),
+    "jsonl": ("application/x-ndjson", "", jsonl_chunk),
+}
+
+def _timestamp(value):
+    """unix-время или ISO-дата («2026-10-01», «2026-10-01T12:00»); без зоны — UTC."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+async def export_applications(request):
+    """GET /admin/applications?format=csv|jsonl&since=&until=&phone=&user_id=&limit=
+
+    Только с заголовком Authorization: Bearer <ADMIN_API_TOKEN>. Ответ
+    отдаётся потоком по мере чтения пачек из базы.
+    """
+    if not ADMIN_API_TOKEN:
+        raise web.HTTPNotFound()
+    auth = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth.encode(), f"Bearer {ADMIN_API_TOKEN}".encode()):
+        raise web.HTTPUnauthorized()
+
+    query = request.query
+    fmt = query.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        raise web.HTTPBadRequest(text="format: csv или jsonl")
+    try:
+        filter_ = Filter(
+            since=_timestamp(query.get("since")),
+            until=_timestamp(query.get("until")),
+            phone=normalize_phone(query["phone"]) if query.get("phone") else None,
+            user_id=int(query["user_id"]) if query.get("user_id") else None,
+            limit=int(query["limit"]) if query.get("limit") else None,
+        )
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=f"Неверный параметр: {e}")
+
+    content_type, header, chunk = EXPORT_FORMATS[fmt]
+    response = web.StreamResponse(headers={
+        "Content-Type": f"{content_type}; charset=utf-8",
+        "Content-Disposition": f'attachment; filename="applications.{fmt}"',
+    })
+    await response.prepare(request)
+    if header:
+        await response.write(header.encode())
+    async for rows in applications.pages(filter_):
+        await response.write(chunk(rows).encode())
+    await response.write_eof()
+    logging.info("📤 ВЫГРУЗКА ЗАЯВОК (%s): %s", fmt, filter_)
+    return response
+
 # ========== НАДЕЖНЫЙ on_startup/on_shutdown ==========
+async def warm_up(app):
+    """Всё, что ходит в сеть: прогрев пула, вебхук, монитор.
+
+    При FAST_START работает в фоне, пока сервер уже принимает /webhook:
+    Telegram после редеплоя шлёт апдейты на старый, ещё действующий вебхук.
+    """
+    started = time.perf_counter()
+    readiness["stage"] = "prewarm"
+    await bot.prewarm()
+    # таблицы маршрутов собрались бы на первом апдейте — соберём заранее
+    message_routes.compile()
+    callback_routes.compile()
+    if WEBHOOK_REGISTER:
+        readiness["stage"] = "webhook"
+        if not await set_webhook_with_retry(bot, WEBHOOK_URL) and POLL_FALLBACK:
+            await polling.start()
+        app["tasks"]["webhook_monitor"] = asyncio.create_task(
+            webhook_monitor(bot, WEBHOOK_URL, interval=WEBHOOK_CHECK_INTERVAL))
+    readiness.update(stage="ready", warm_up=round(time.perf_counter() - started, 3))
+    logging.info("✅ БОТ ГОТОВ за %.2f с", readiness["warm_up"])
+    try:
+        webhook_info = await bot.get_webhook_info()
+        logging.info("📋 WEBHOOK INFO: %s", webhook_info)
+    except Exception as e:
+        logging.error("❌ не удалось получить WEBHOOK INFO: %s", e)
+
 async def on_startup(app):
-    await set_webhook_with_retry(bot, WEBHOOK_URL)
-    asyncio.create_task(webhook_monitor(bot, WEBHOOK_URL, interval=60))
-    webhook_info = await bot.get_webhook_info()
-    logging.info(f"📋 WEBHOOK INFO: {webhook_info}")
+    # только локальная подготовка: сервер не должен ждать Telegram
+    bot.scheduler.start()
+    if UPDATE_WORKERS > 0:
+        await update_queue.start()
+    outbox.start()
+    if FAQ_RELOAD_INTERVAL > 0:
+        asyncio.create_task(faq.watch(FAQ_RELOAD_INTERVAL))
+    if FAST_START:
+        app["tasks"]["warm_up"] = asyncio.create_task(warm_up(app))
+    else:
+        await warm_up(app)
+
+async def drain(deadline: float):
+    """Дорабатывает уже принятые апдейты и отправки до deadline (monotonic)."""
+    def left():
+        return max(0.0, deadline - time.monotonic())
+
+    await update_queue.stop(timeout=left())
+    while inline_updates and left():
+        await asyncio.sleep(0.05)
+    logging.info("🔴 ОЧЕРЕДЬ АПДЕЙТОВ ОСТАНОВЛЕНА")
+    # заявки админу лежат на диске и уйдут после рестарта, ждать их не нужно
+    await outbox.stop()
+    # ответы пользователям — в памяти планировщика, их стоит дождаться
+    await bot.scheduler.stop(timeout=left())
+    lost = update_queue.depth() + len(inline_updates)
+    if lost:
+        logging.warning("⚠️ НЕ УСПЕЛИ ОБРАБОТАТЬ %s апдейтов за %s с", lost, SHUTDOWN_TIMEOUT)
 
 async def on_shutdown(app):
+    """Плавная остановка для редеплоя без простоя.
+
+    Новые апдейты получают 503 — Telegram повторит их, уже новому
+    экземпляру, — а принятые дорабатываются не дольше SHUTDOWN_TIMEOUT.
+    Вебхук удаляется только при WEBHOOK_DELETE_ON_SHUTDOWN=1.
+    """
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    readiness["stage"] = "draining"
+    logging.warning("🟠 ОСТАНОВКА: новые апдейты не принимаются, дорабатываю очередь")
     try:
-        await bot.delete_webhook()
-        logging.info("🔴 WEBHOOK УДАЛЕН")
+        # монитор не должен трогать вебхук во время остановки
+        if "warm_up" in app["tasks"]:
+            app["tasks"]["warm_up"].cancel()
+        if "webhook_monitor" in app["tasks"]:
+            app["tasks"]["webhook_monitor"].cancel()
+        await polling.stop()
+        if WEBHOOK_REGISTER and WEBHOOK_DELETE_ON_SHUTDOWN:
+            await bot.delete_webhook()
+            logging.info("🔴 WEBHOOK УДАЛЕН")
+        await drain(deadline)
+        applications.close()
         await dp.storage.close()
         await dp.storage.wait_closed()
         logging.info("🔴 STORAGE ЗАКРЫТ")
+        await bot.close_session()
     except Exception as e:
-        logging.error(f"❌ ОШИБКА ПРИ ЗАВЕРШЕНИИ: {e}")
+        logging.error("❌ ОШИБКА ПРИ ЗАВЕРШЕНИИ: %s", e)
+
+# стадия прогрева для /ready и сколько занял импорт этого модуля
+readiness = {"stage": "starting", "import": round(time.perf_counter() - _import_started, 3)}
 
 # ========== ЗАПУСК СЕРВЕРА ==========
-if __name__ == '__main__':
-    app = web.Application()
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[webhook_timing])
     app.router.add_post(WEBHOOK_PATH, webhook_handler)
     app.router.add_get("/ping", ping)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/admin/applications", export_applications)
+    # фоновые задачи: после старта приложение заморожено, а этот словарь — нет
+    app["tasks"] = {}
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
-    logging.info(f"🚀 ЗАПУСК СЕРВЕРА НА {WEBAPP_HOST}:{WEBAPP_PORT}")
+    return app
+
+if __name__ == '__main__':
+    app = create_app()
+    logging.info("🚀 ЗАПУСК СЕРВЕРА НА %s:%s", WEBAPP_HOST, WEBAPP_PORT)
     web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT)
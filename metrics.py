@@ -0,0 +1,219 @@
+import time
+from bisect import bisect_left
+
+from aiogram import Bot
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, value: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Gauge:
+    """Значение снимается в момент запроса /metrics: collect() -> {labels: value}."""
+
+    def __init__(self, name: str, help: str, collect, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.collect().items():
+            if not isinstance(labels, tuple):
+                labels = (labels,)
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами.
+
+    Для каждого набора меток хранится заранее выделенный список счётчиков;
+    observe() — это bisect и два сложения, без блокировок: всё работает в
+    одном event loop.
+    """
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}        # метки -> [счётчики корзин..., +Inf, сумма]
+
+    def prepare(self, *labels):
+        """Заранее создаёт серию, чтобы она была видна и с нулями."""
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels) or self.prepare(*labels)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _labels(self.labels + ("le",), labels + (bound,))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_seconds = registry.add(Histogram(
+    "maral_handler_seconds", "Время выполнения хендлера", labels=("handler",)))
+update_seconds = registry.add(Histogram(
+    "maral_update_seconds", "Полное время обработки апдейта диспетчером"))
+updates_total = registry.add(Counter(
+    "maral_updates_total", "Апдейты по типу", labels=("type",)))
+webhook_seconds = registry.add(Histogram(
+    "maral_webhook_seconds", "Время ответа на запрос вебхука", labels=("status",)))
+bot_api_seconds = registry.add(Histogram(
+    "maral_bot_api_seconds", "Время вызова Bot API", labels=("method",)))
+bot_api_errors = registry.add(Counter(
+    "maral_bot_api_errors_total", "Ошибки вызовов Bot API", labels=("method", "error")))
+throttled_total = registry.add(Counter(
+    "maral_throttled_total", "Апдейты, отброшенные антифлудом", labels=("group",)))
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Считает апдейты и время хендлеров, складывая отметки прямо в data.
+
+    Dispatcher.process_update вызывается напрямую, минуя updates_handler,
+    поэтому апдейты считаются на уровне message/callback_query.
+    """
+
+    def __init__(self, dispatcher=None):
+        super().__init__()
+        if dispatcher is not None:
+            self.prepare(dispatcher)
+
+    @staticmethod
+    def prepare(dispatcher):
+        for observer in (dispatcher.message_handlers, dispatcher.callback_query_handlers):
+            for handler_obj in observer.handlers:
+                handler_seconds.prepare(handler_obj.handler.__name__)
+        update_seconds.prepare()
+
+    @staticmethod
+    def _received(kind: str, data: dict):
+        updates_total.inc(kind)
+        data["_metrics_update"] = time.perf_counter()
+
+    @staticmethod
+    def _handler_started(data: dict):
+        data["_metrics_handler"] = (current_handler.get().__name__, time.perf_counter())
+
+    @staticmethod
+    def _done(data: dict):
+        now = time.perf_counter()
+        mark = data.pop("_metrics_handler", None)
+        if mark is not None:
+            handler_seconds.observe(now - mark[1], mark[0])
+        started = data.pop("_metrics_update", None)
+        if started is not None:
+            update_seconds.observe(now - started)
+
+    async def on_pre_process_message(self, message, data: dict):
+        self._received("message", data)
+
+    async def on_process_message(self, message, data: dict):
+        self._handler_started(data)
+
+    async def on_post_process_message(self, message, results, data: dict):
+        self._done(data)
+
+    async def on_pre_process_edited_message(self, message, data: dict):
+        self._received("edited_message", data)
+
+    async def on_post_process_edited_message(self, message, results, data: dict):
+        self._done(data)
+
+    async def on_pre_process_callback_query(self, callback_query, data: dict):
+        self._received("callback_query", data)
+
+    async def on_process_callback_query(self, callback_query, data: dict):
+        self._handler_started(data)
+
+    async def on_post_process_callback_query(self, callback_query, results, data: dict):
+        self._done(data)
+
+
+class MetricsBot(Bot):
+    """Bot, замеряющий время и ошибки каждого вызова Bot API."""
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception as e:
+            bot_api_errors.inc(method, type(e).__name__)
+            raise
+        finally:
+            bot_api_seconds.observe(time.perf_counter() - started, method)
+
+
+def fsm_state_counts(storage) -> dict:
+    """Число сессий по состояниям FSM для хранилищ из fsm_storage и MemoryStorage."""
+    if hasattr(storage, "state_counts"):
+        return storage.state_counts()
+    counts = {}
+    for users in getattr(storage, "data", {}).values():
+        for record in users.values():
+            state = record.get("state")
+            if state is not None:
+                counts[state] = counts.get(state, 0) + 1
+    return counts
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiogram.utils.exceptions import BadRequest, RetryAfter
+
+DIGEST_SEPARATOR = "\n\n━━━━━━━━━━━━━━━━━━━━━\n\n"
+MESSAGE_LIMIT = 4096
+
+
+class AdminOutbox:
+    """Надёжная очередь уведомлений админу на SQLite.
+
+    Хендлер только записывает текст в базу (put) и сразу отвечает
+    пользователю. Фоновая задача (run) забирает накопившиеся записи,
+    склеивает всплеск заявок в дайджесты и отправляет их; при ошибке
+    повторяет с экспоненциальной задержкой. Запись удаляется только после
+    успешной отправки, поэтому рестарт ничего не теряет.
+    """
+
+    def __init__(self, path: str, send, batch_window: float = 2.0,
+                 max_chars: int = 3800, base_delay: float = 2.0, max_delay: float = 300.0):
+        self.path = path
+        self._send = send                    # async send(text, parse_mode)
+        self.batch_window = batch_window
+        self.max_chars = max_chars
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.sent = 0
+        self.digests = 0
+        self.failures = 0
+
+    # ---------- база (только в потоке executor) ----------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " created REAL NOT NULL, text TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_try REAL NOT NULL DEFAULT 0)"
+            )
+        return self._conn
+
+    def _insert(self, text: str):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT INTO outbox (created, text) VALUES (?, ?)", (time.time(), text))
+
+    def _due(self, now: float, limit: int = 100):
+        return self._connect().execute(
+            "SELECT id, text, attempts FROM outbox WHERE next_try <= ? ORDER BY id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+
+    def _next_due(self):
+        row = self._connect().execute("SELECT MIN(next_try) FROM outbox").fetchone()
+        return row[0]
+
+    def _delete(self, ids):
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def _postpone(self, ids, attempts: int, next_try: float):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE outbox SET attempts = ?, next_try = ? WHERE id = ?",
+                [(attempts, next_try, i) for i in ids],
+            )
+
+    def _pending(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # ---------- API ----------
+    async def put(self, text: str):
+        """Сохраняет уведомление на диск; исключение — если записать не удалось."""
+        await self._db(self._insert, text)
+        self._wakeup.set()
+
+    async def pending(self) -> int:
+        return await self._db(self._pending)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="admin-outbox")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _digests(self, rows):
+        """Склеивает записи в сообщения не длиннее max_chars."""
+        batch, size = [], 0
+        for row in rows:
+            extra = len(row[1]) + (len(DIGEST_SEPARATOR) if batch else 0)
+            if batch and size + extra > self.max_chars:
+                yield batch
+                batch, size = [], 0
+                extra = len(row[1])
+            batch.append(row)
+            size += extra
+        if batch:
+            yield batch
+
+    async def _deliver(self, batch) -> bool:
+        text = DIGEST_SEPARATOR.join(row[1] for row in batch)
+        if len(batch) > 1:
+            text = f"📦 *{len(batch)} жаңа өтінім*{DIGEST_SEPARATOR}{text}"
+        if len(text) > MESSAGE_LIMIT:
+            text = text[:MESSAGE_LIMIT - 1] + "…"
+        ids = [row[0] for row in batch]
+        try:
+            try:
+                await self._send(text, "Markdown")
+            except BadRequest as e:
+                # пользовательский текст сломал разметку — шлём как есть
+                logging.warning("⚠️ OUTBOX: Markdown не принят (%s), отправляю без разметки", e)
+                await self._send(text, None)
+        except RetryAfter as e:
+            logging.warning("⚠️ OUTBOX: лимит Telegram, жду %s с", e.timeout)
+            await asyncio.sleep(e.timeout)
+            return False
+        except Exception as e:
+            self.failures += 1
+            attempts = max(row[2] for row in batch) + 1
+            delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+            logging.error("❌ OUTBOX: ошибка отправки админу (%s), повтор через %s с", e, delay)
+            await self._db(self._postpone, ids, attempts, time.time() + delay)
+            return False
+        await self._db(self._delete, ids)
+        self.sent += len(batch)
+        self.digests += 1
+        logging.info("✅ OUTBOX: отправлено админу %s заявок", len(batch))
+        return True
+
+    async def drain(self) -> int:
+        """Отправляет всё, что уже пора отправить; возвращает число доставленных."""
+        delivered = 0
+        rows = await self._db(self._due, time.time())
+        for batch in self._digests(rows):
+            if not await self._deliver(batch):
+                break
+            delivered += len(batch)
+        return delivered
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            next_due = await self._db(self._next_due)
+            if next_due is None:
+                timeout = None
+            else:
+                timeout = max(0.0, next_due - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                # пришла новая заявка — подождём, вдруг следом идут ещё
+                await asyncio.sleep(self.batch_window)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.drain()
+            except Exception as e:
+                logging.error("❌ OUTBOX: %s", e)
+                await asyncio.sleep(self.base_delay)
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "digests": self.digests,
+            "failures": self.failures,
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.bot import api
+
+# ответы ingest(), после которых апдейт нужно получить ещё раз
+RETRY_STATUSES = (500, 503)
+
+
+class PollingFallback:
+    """Приём апдейтов через getUpdates, пока вебхук не работает.
+
+    Апдейты забираются пачками до limit штук с долгим опросом и отдаются в
+    тот же ingest(), что и вебхук (дедупликация + очередь). offset сдвигается
+    только за принятыми апдейтами: если очередь забита, тот же апдейт придёт
+    в следующем опросе. Перед возвратом к вебхуку stop() подтверждает
+    offset в Telegram, иначе вебхук заново доставит уже обработанное.
+    """
+
+    def __init__(self, bot: Bot, ingest, limit: int = 100, timeout: int = 25,
+                 error_delay: float = 5.0, retry_delay: float = 1.0):
+        self.bot = bot
+        self.ingest = ingest
+        self.limit = limit
+        self.timeout = timeout
+        self.error_delay = error_delay
+        self.retry_delay = retry_delay
+        self.offset = None
+        self._task = None
+        # метрики
+        self.polls = 0
+        self.received = 0
+        self.activations = 0
+        self.active_since = None
+
+    @property
+    def active(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """Снимает вебхук (иначе getUpdates вернёт 409) и начинает опрос."""
+        if self._task is not None:
+            return
+        await self.bot.delete_webhook(drop_pending_updates=False)
+        self.activations += 1
+        self.active_since = time.monotonic()
+        self._task = asyncio.create_task(self._run(), name="polling-fallback")
+        logging.warning("🔁 ВЕБХУК НЕ РАБОТАЕТ — ПЕРЕХОД НА getUpdates")
+
+    async def stop(self):
+        """Останавливает опрос и подтверждает offset перед setWebhook."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self.active_since = None
+        if self.offset is not None:
+            # апдейты до offset помечаются в Telegram как полученные;
+            # всё, что вернётся этим вызовом, ещё раз придёт через вебхук
+            await self.bot.request(api.Methods.GET_UPDATES,
+                                   {"offset": self.offset, "limit": 1, "timeout": 0})
+        logging.warning("🔁 ОПРОС ОСТАНОВЛЕН, offset %s", self.offset)
+
+    async def poll_once(self) -> int:
+        payload = {"limit": self.limit, "timeout": self.timeout}
+        if self.offset is not None:
+            payload["offset"] = self.offset
+        # общий таймаут запроса должен быть больше времени долгого опроса
+        with self.bot.request_timeout(self.timeout + 10):
+            updates = await self.bot.request(api.Methods.GET_UPDATES, payload)
+        self.polls += 1
+        for data in updates:
+            # своя задача на апдейт, как в UpdateQueue: aiogram кэширует
+            # состояние FSM в contextvars, и без этого при UPDATE_WORKERS=0
+            # следующий апдейт пачки увидел бы состояние предыдущего
+            status = await asyncio.create_task(self.ingest(data))
+            if status in RETRY_STATUSES:
+                # бот перегружен — не долбим Telegram тем же апдейтом
+                await asyncio.sleep(self.retry_delay)
+                break
+            self.offset = data["update_id"] + 1
+            self.received += 1
+        return len(updates)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error("❌ ОШИБКА getUpdates: %s", e)
+                await asyncio.sleep(self.error_delay)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "active_for": time.monotonic() - self.active_since if self.active_since else 0.0,
+            "offset": self.offset,
+            "polls": self.polls,
+            "received": self.received,
+            "activations": self.activations,
+        }
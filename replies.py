@@ -0,0 +1,63 @@
+import logging
+from typing import NamedTuple, Optional, Union
+
+from aiogram import types
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.exceptions import MessageNotModified, TelegramAPIError
+
+Markup = Union[types.ReplyKeyboardMarkup, types.ReplyKeyboardRemove,
+               InlineKeyboardMarkup, str, None]
+
+
+class Step(NamedTuple):
+    """Один шаг диалога: текст, клавиатура под полем ввода и кнопка «назад».
+
+    reply_markup — обычная (reply) клавиатура, back — inline-клавиатура
+    навигации. Telegram позволяет прикрепить к сообщению только одну
+    клавиатуру, поэтому шаг стоит 1 вызов API, если задано что-то одно,
+    и 2 вызова, если нужны обе.
+    """
+    text: str
+    parse_mode: Optional[str] = None
+    reply_markup: Markup = None
+    back: Union[InlineKeyboardMarkup, str, None] = None
+    back_hint: str = "_Артқа қайту үшін:_"
+
+    @property
+    def inline_only(self) -> bool:
+        return self.reply_markup is None
+
+
+async def send_step(message: types.Message, step: Step):
+    """Отправляет шаг минимальным числом сообщений."""
+    if step.inline_only:
+        return await message.answer(step.text, parse_mode=step.parse_mode,
+                                    reply_markup=step.back)
+    sent = await message.answer(step.text, parse_mode=step.parse_mode,
+                                reply_markup=step.reply_markup)
+    if step.back is not None:
+        await message.answer(step.back_hint, parse_mode="Markdown", reply_markup=step.back)
+    return sent
+
+
+async def show_step(callback_query: types.CallbackQuery, step: Step):
+    """Показывает шаг в ответ на нажатие inline-кнопки.
+
+    Если шагу не нужна reply-клавиатура, сообщение с кнопкой редактируется
+    на месте (1 вызов). Иначе у старого сообщения убирается inline-кнопка
+    и шаг отправляется заново.
+    """
+    message = callback_query.message
+    if step.inline_only:
+        try:
+            return await message.edit_text(step.text, parse_mode=step.parse_mode,
+                                           reply_markup=step.back)
+        except MessageNotModified:
+            return message
+        except TelegramAPIError as e:
+            logging.info("✏️ РЕДАКТИРОВАНИЕ НЕ УДАЛОСЬ (%s), ОТПРАВЛЯЮ ЗАНОВО", e)
+    try:
+        await message.edit_reply_markup(reply_markup=None)
+    except Exception:
+        pass
+    return await send_step(message, step)
@@ -0,0 +1,247 @@
+from aiogram import types
+from aiogram.dispatcher.filters import Command, ContentTypeFilter, StateFilter, Text
+from aiogram.dispatcher.filters.filters import FilterNotPassed, check_filters
+from aiogram.dispatcher.handler import (
+    CancelHandler, Handler, SkipHandler, _check_spec, ctx_data, current_handler,
+)
+
+ANY_STATE = "*"
+ANY_KEY = object()      # фильтр мог бы пропустить любой текст
+
+
+def _filter_keys(filter_):
+    """Что известно о тексте/callback_data, который пропустит фильтр.
+
+    frozenset — ровно эти значения; tuple — префиксы команд; ANY_KEY — что
+    угодно (лямбды, contains/startswith и прочие фильтры, которые мы не
+    разбираем); None — фильтр на текст не смотрит.
+    """
+    if isinstance(filter_, (StateFilter, ContentTypeFilter)):
+        return None
+    if isinstance(filter_, Text):
+        if (filter_.equals is not None and not filter_.ignore_case
+                and all(isinstance(e, str) for e in filter_.equals)):
+            return frozenset(filter_.equals)
+        return ANY_KEY
+    if isinstance(filter_, Command):
+        return tuple(filter_.prefixes)
+    return ANY_KEY
+
+
+class _Route:
+    """Разобранные фильтры одного хендлера."""
+    __slots__ = ("obj", "states", "text", "text_only", "keys")
+
+    def __init__(self, obj: Handler.HandlerObj):
+        self.obj = obj
+        self.states = None          # None — без StateFilter, т.е. в любом состоянии
+        self.text = True            # может ли сработать на текстовое сообщение
+        self.text_only = True       # и только на текстовое (не на подпись к фото)
+        self.keys = ANY_KEY
+        known = []
+        for f in obj.filters or ():
+            filter_ = f.filter
+            if isinstance(filter_, StateFilter):
+                self.states = frozenset(filter_.states)
+            elif isinstance(filter_, ContentTypeFilter):
+                content_types = set(filter_.content_types)
+                self.text = bool(content_types & {types.ContentType.ANY, types.ContentType.TEXT})
+                self.text_only = content_types == {types.ContentType.TEXT}
+            keys = _filter_keys(filter_)
+            if keys is not None:
+                known.append(keys)
+        # точный маршрут — единственный фильтр на текст, и это Text(equals=...)
+        if len(known) == 1:
+            self.keys = known[0]
+
+    @property
+    def exact(self) -> bool:
+        return isinstance(self.keys, frozenset) and self.text_only
+
+    def admits(self, state) -> bool:
+        return self.states is None or ANY_STATE in self.states or state in self.states
+
+    def may_match(self, key) -> bool:
+        """Может ли хендлер сработать на этот текст (консервативно)."""
+        if not self.text:
+            return False
+        if self.keys is ANY_KEY:
+            return True
+        if isinstance(self.keys, tuple):            # префиксы команд
+            return key.lstrip()[:1] in self.keys
+        return key in self.keys
+
+
+class RoutingHandler(Handler):
+    """Handler, который находит первый подходящий хендлер по хэш-таблице.
+
+    Стандартный Handler.notify проверяет фильтры всех хендлеров по порядку.
+    Здесь хендлеры заранее разложены по состояниям FSM, а точные совпадения
+    (Text(equals=...) по тексту кнопки или callback_data) собраны в таблицу
+    (состояние, текст) -> хвост списка хендлеров, начиная с нужного.
+    Маршрут попадает в таблицу, только если ни один более ранний хендлер
+    для этого состояния не мог бы перехватить тот же текст, поэтому
+    порядок регистрации соблюдается, а фильтры выбранного хендлера всё
+    равно проверяются обычным образом (и SkipHandler работает как раньше).
+    """
+
+    def __init__(self, dispatcher, once=True, middleware_key=None):
+        super().__init__(dispatcher, once=once, middleware_key=middleware_key)
+        self._setup()
+
+    def _setup(self):
+        self._routes = None
+        self._by_state = None
+        self._misses = None
+        self.hits = 0
+        self.misses = 0
+        self.scans = 0
+
+    @classmethod
+    def adopt(cls, observer: Handler) -> "RoutingHandler":
+        """Превращает уже созданный Handler в RoutingHandler на месте.
+
+        На объект ссылается не только диспетчер: записи FiltersFactory
+        хранят его в event_handlers, и по ним @dp.message_handler(commands=...)
+        находит свои фильтры. Новый объект вместо старого сломал бы
+        регистрацию хендлеров после install().
+        """
+        observer.__class__ = cls
+        observer._setup()
+        return observer
+
+    # ---------- регистрация ----------
+    def register(self, handler, filters=None, index=None):
+        super().register(handler, filters, index)
+        self._routes = None
+
+    def unregister(self, handler):
+        self._routes = None
+        return super().unregister(handler)
+
+    def compile(self):
+        parsed = [_Route(obj) for obj in self.handlers]
+        states = {None}
+        for route in parsed:
+            states.update(s for s in route.states or () if s != ANY_STATE)
+
+        routes, by_state, misses = {}, {}, {}
+        for state in states:
+            candidates = [r for r in parsed if r.admits(state)]
+            handlers = tuple(r.obj for r in candidates)
+            by_state[state] = handlers
+            # если текст не совпал ни с одной кнопкой, точные хендлеры не нужны
+            misses[state] = tuple(r.obj for r in candidates if not r.exact)
+            for position, route in enumerate(candidates):
+                if not route.exact:
+                    continue
+                for key in route.keys:
+                    if (state, key) in routes:
+                        continue            # раньше уже есть хендлер на этот текст
+                    earlier = candidates[:position]
+                    if any(r.may_match(key) for r in earlier if not r.exact):
+                        routes[state, key] = handlers      # неоднозначно — полный перебор
+                    else:
+                        routes[state, key] = handlers[position:]
+        self._routes, self._by_state, self._misses = routes, by_state, misses
+
+    def stats(self) -> dict:
+        return {"routes": len(self._routes or ()), "hits": self.hits,
+                "misses": self.misses, "scans": self.scans}
+
+    # ---------- диспетчеризация ----------
+    @staticmethod
+    def _key(obj):
+        if isinstance(obj, types.CallbackQuery):
+            return obj.data
+        if isinstance(obj, types.Message) and obj.content_type == types.ContentType.TEXT:
+            return obj.text
+        return None
+
+    async def _state(self, obj):
+        """Состояние FSM — тем же путём и с тем же кэшем, что у StateFilter."""
+        try:
+            return StateFilter.ctx_state.get()
+        except LookupError:
+            pass
+        if isinstance(obj, types.CallbackQuery):
+            chat = obj.message.chat.id if obj.message else None
+            user = obj.from_user.id if obj.from_user else None
+        else:
+            chat = obj.chat.id if obj.chat else None
+            user = obj.from_user.id if obj.from_user else None
+        if not (chat or user):
+            raise LookupError
+        state = await self.dispatcher.storage.get_state(chat=chat, user=user)
+        StateFilter.ctx_state.set(state)
+        return state
+
+    async def _candidates(self, obj):
+        if self._routes is None:
+            self.compile()
+        try:
+            state = await self._state(obj)
+        except LookupError:
+            self.scans += 1
+            return self.handlers
+        if state not in self._by_state:
+            # состояние, о котором не знает ни один фильтр (старые данные и т.п.)
+            self.scans += 1
+            return self.handlers
+        key = self._key(obj)
+        if key is not None:
+            handlers = self._routes.get((state, key))
+            if handlers is not None:
+                self.hits += 1
+                return handlers
+        self.misses += 1
+        return self._misses[state]
+
+    async def notify(self, *args):
+        """Handler.notify, но перебор начинается с найденного по таблице хендлера."""
+        results = []
+
+        data = {}
+        ctx_data.set(data)
+
+        if self.middleware_key:
+            try:
+                await self.dispatcher.middleware.trigger(f"pre_process_{self.middleware_key}", args + (data,))
+            except CancelHandler:  # Allow to cancel current event
+                return results
+
+        try:
+            for handler_obj in await self._candidates(args[0]):
+                try:
+                    data.update(await check_filters(handler_obj.filters, args))
+                except FilterNotPassed:
+                    continue
+                else:
+                    ctx_token = current_handler.set(handler_obj.handler)
+                    try:
+                        if self.middleware_key:
+                            await self.dispatcher.middleware.trigger(f"process_{self.middleware_key}", args + (data,))
+                        partial_data = _check_spec(handler_obj.spec, data)
+                        response = await handler_obj.handler(*args, **partial_data)
+                        if response is not None:
+                            results.append(response)
+                        if self.once:
+                            break
+                    except SkipHandler:
+                        continue
+                    except CancelHandler:
+                        break
+                    finally:
+                        current_handler.reset(ctx_token)
+        finally:
+            if self.middleware_key:
+                await self.dispatcher.middleware.trigger(f"post_process_{self.middleware_key}",
+                                                         args + (results, data,))
+
+        return results
+
+
+def install(dispatcher):
+    """Переводит обработчики сообщений и callback-запросов на RoutingHandler."""
+    return (RoutingHandler.adopt(dispatcher.message_handlers),
+            RoutingHandler.adopt(dispatcher.callback_query_handlers))
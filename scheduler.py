@@ -0,0 +1,258 @@
+import asyncio
+import contextlib
+import functools
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.utils.exceptions import RetryAfter
+
+# классы приоритета: меньше — важнее
+PRIORITY_USER = 0          # ответы пользователю
+PRIORITY_ADMIN = 1         # уведомления админу (outbox)
+PRIORITY_BACKGROUND = 2    # служебные вызовы (монитор вебхука и т.п.)
+
+send_priority = ContextVar("send_priority", default=PRIORITY_USER)
+
+# методы, которые Telegram считает отправкой сообщений и ограничивает
+LIMITED_PREFIXES = ("send", "edit", "forward", "copy")
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Все вызовы Bot API внутри блока идут с указанным приоритетом."""
+    token = send_priority.set(level)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до появления жетона (0 — можно сразу)."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float):
+        """Опустошает ведро на seconds (ответ 429 с retry_after)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "call", "future", "enqueued", "retries", "throttled")
+
+    def __init__(self, priority, seq, chat_id, call, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.retries = 0
+        self.throttled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class OutboundScheduler:
+    """Единая очередь исходящих вызовов Bot API.
+
+    Общее ведро жетонов ограничивает ~30 сообщений/с на бота, ведро на
+    каждый чат — ~1 сообщение/с (с небольшим запасом burst). Из готовых к
+    отправке заданий первым уходит задание с наивысшим приоритетом; ответ
+    429 ставит соответствующее ведро на паузу retry_after и возвращает
+    задание в очередь.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1,
+                 chat_burst: float = 3, max_retries: int = 3, max_chat_buckets: int = 10000):
+        # при WEB_WORKERS доля воркера бывает меньше 1/с — ведру нужен хотя бы один жетон
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chat_buckets = max_chat_buckets
+        self._chats = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._inflight = set()
+        # метрики
+        self.sent = 0
+        self.throttled = 0
+        self.retry_after = 0
+        self.delay_total = 0.0
+        self.delay_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="outbound-scheduler")
+
+    async def stop(self, timeout: float = 5.0):
+        """Дожидается отправки очереди (не дольше timeout) и останавливается."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._heap or self._inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        for job in self._heap:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("outbound scheduler stopped"))
+        self._heap.clear()
+
+    @staticmethod
+    def is_limited(method: str) -> bool:
+        return method.startswith(LIMITED_PREFIXES)
+
+    def submit(self, call, chat_id=None, priority: int = PRIORITY_USER) -> asyncio.Future:
+        """Ставит вызов call() в очередь; future получает его результат."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, _Job(priority, next(self._seq), chat_id, call, future))
+        self._wakeup.set()
+        return future
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chat_buckets:
+                # полные ведра ничего не помнят — их можно выбросить
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_full(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _pick(self, now):
+        """Первое по приоритету готовое задание или время до ближайшей готовности."""
+        wait = self.global_bucket.wait_time(now)
+        if wait > 0:
+            return None, wait
+        wait = None
+        for job in sorted(self._heap):
+            if job.chat_id is None:
+                return job, 0.0
+            job_wait = self._chat_bucket(job.chat_id, now).wait_time(now)
+            if job_wait == 0:
+                return job, 0.0
+            job.throttled = True
+            wait = job_wait if wait is None else min(wait, job_wait)
+        return None, wait
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            job, wait = self._pick(now)
+            if job is None:
+                for waiting in self._heap:
+                    waiting.throttled = True
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._heap.remove(job)
+            heapq.heapify(self._heap)
+            if job.future.cancelled():      # вызвавший хендлер уже отменён
+                continue
+            self.global_bucket.take()
+            if job.chat_id is not None:
+                self._chat_bucket(job.chat_id, now).take()
+            if job.throttled:
+                self.throttled += 1
+            delay = now - job.enqueued
+            self.delay_total += delay
+            self.delay_max = max(self.delay_max, delay)
+            task = asyncio.create_task(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job: _Job):
+        try:
+            result = await job.call()
+        except RetryAfter as e:
+            self.retry_after += 1
+            now = time.monotonic()
+            if job.chat_id is not None:
+                self._chat_bucket(job.chat_id, now).pause(now, e.timeout)
+            else:
+                self.global_bucket.pause(now, e.timeout)
+            if job.retries < self.max_retries:
+                logging.warning("⚠️ 429 от Telegram, повтор через %s с", e.timeout)
+                job.retries += 1
+                heapq.heappush(self._heap, job)
+                self._wakeup.set()
+            elif not job.future.done():
+                job.future.set_exception(e)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def stats(self) -> dict:
+        sent = self.sent
+        return {
+            "global_rate": self.global_bucket.rate,
+            "queued": len(self._heap),
+            "inflight": len(self._inflight),
+            "sent": sent,
+            "throttled": self.throttled,
+            "retry_after": self.retry_after,
+            "queue_delay_avg": self.delay_total / sent if sent else 0.0,
+            "queue_delay_max": self.delay_max,
+            "chat_buckets": len(self._chats),
+        }
+
+
+class ScheduledBot(Bot):
+    """Bot, у которого все отправки сообщений идут через OutboundScheduler."""
+
+    scheduler: OutboundScheduler = None
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        scheduler = self.scheduler
+        if scheduler is None or not scheduler.running or not scheduler.is_limited(method):
+            return await super().request(method, data, files, **kwargs)
+        call = functools.partial(super().request, method, data, files, **kwargs)
+        chat_id = data.get("chat_id") if data else None
+        return await scheduler.submit(call, chat_id, send_priority.get())
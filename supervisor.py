@@ -0,0 +1,317 @@
+"""Многопроцессный режим: фронт-диспетчер и N процессов бота.
+
+Фронт слушает WEBAPP_PORT, проверяет секрет и пересылает тело апдейта
+как есть воркеру, которому принадлежит чат (id чата по модулю числа
+воркеров). Апдейты одного чата всегда попадают в один процесс, поэтому
+порядок шагов формы и состояние FSM остаются локальными для воркера.
+SO_REUSEPORT так не умеет: ядро раскидывает соединения, а не чаты.
+
+Каждый воркер — обычный main.py на 127.0.0.1:WORKER_BASE_PORT+i со своим
+DATA_DIR/worker-i; вебхук ставит и сторожит только воркер 0 (он же при
+падении вебхука забирает getUpdates и отдаёт апдейты фронту). Упавший
+воркер перезапускается с нарастающей паузой, /metrics и /stats фронта
+собирают данные всех воркеров с меткой worker. Журнал заявок у всех
+общий (SQLite в WAL спокойно принимает короткие вставки из нескольких
+процессов), и /admin/applications фронт отдаёт потоком через любой живой
+воркер. Глобальный лимит отправок TG_GLOBAL_RATE делится между воркерами
+поровну.
+
+Запуск: WEB_WORKERS=4 python supervisor.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+import metrics
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+load_dotenv()
+
+WEBHOOK_SECRET   = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_PATH     = "/webhook"
+WEBAPP_HOST      = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT      = int(os.getenv("PORT", 10000))
+WEB_WORKERS      = max(1, int(os.getenv("WEB_WORKERS", os.cpu_count() or 1)))
+WORKER_BASE_PORT = int(os.getenv("WORKER_BASE_PORT", WEBAPP_PORT + 1))
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", 30))
+DATA_DIR         = os.getenv("DATA_DIR", ".")
+# общий лимит Telegram на весь бот: каждый воркер получает свою долю, иначе
+# N процессов отправляли бы N×TG_GLOBAL_RATE сообщений в секунду
+TG_GLOBAL_RATE   = float(os.getenv("TG_GLOBAL_RATE", 30))
+APPLICATIONS_DB_PATH = os.getenv("APPLICATIONS_DB_PATH", os.path.join(DATA_DIR, "applications.sqlite3"))
+MAIN_PATH        = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+logging.basicConfig(
+    level=logging.INFO if os.getenv("DEBUG") == "1" else logging.WARNING,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+CHAT_KINDS = ("message", "edited_message", "channel_post", "edited_channel_post")
+
+forwarded = metrics.Counter(
+    "maral_front_updates_total", "Апдейты, пересланные фронтом", labels=("worker", "status"))
+restarts = metrics.Counter(
+    "maral_worker_restarts_total", "Перезапуски упавших воркеров", labels=("worker",))
+
+
+def chat_key(data: dict) -> int:
+    """id чата апдейта — тот же ключ, что у update_chat_key в main.py."""
+    for kind in CHAT_KINDS:
+        obj = data.get(kind)
+        if obj:
+            return obj["chat"]["id"]
+    query = data.get("callback_query")
+    if query:
+        message = query.get("message")
+        return message["chat"]["id"] if message else query["from"]["id"]
+    return data.get("update_id") or 0
+
+
+class Worker:
+    """Процесс бота, который перезапускается, пока супервизор работает."""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = None
+        self.crashes = 0
+        self._task = None
+        self._stopping = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    def _env(self) -> dict:
+        data_dir = os.path.join(DATA_DIR, f"worker-{self.index}")
+        os.makedirs(data_dir, exist_ok=True)
+        env = dict(os.environ)
+        env.update(
+            PORT=str(self.port),
+            WEBAPP_HOST="127.0.0.1",
+            DATA_DIR=data_dir,
+            # лимит на чат делить не нужно: чат всегда живёт в одном воркере
+            TG_GLOBAL_RATE=str(TG_GLOBAL_RATE / WEB_WORKERS),
+            # журнал заявок один на все процессы, иначе выгрузка видела бы часть
+            APPLICATIONS_DB_PATH=os.path.abspath(APPLICATIONS_DB_PATH),
+            WEBHOOK_REGISTER="1" if self.index == 0 else "0",
+            # апдейты из резервного getUpdates тоже идут через фронт
+            POLL_FORWARD_URL=f"http://127.0.0.1:{WEBAPP_PORT}{WEBHOOK_PATH}",
+        )
+        return env
+
+    def start(self):
+        self._task = asyncio.create_task(self._keep_alive(), name=f"web-worker-{self.index}")
+
+    async def _keep_alive(self):
+        while not self._stopping:
+            started = time.monotonic()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, MAIN_PATH, env=self._env())
+            logging.info("🧩 ВОРКЕР %s ЗАПУЩЕН: pid %s, порт %s",
+                         self.index, self.process.pid, self.port)
+            code = await self.process.wait()
+            if self._stopping:
+                return
+            # проработал долго — считаем падение случайным, пауза с нуля
+            if time.monotonic() - started > 60:
+                self.crashes = 0
+            self.crashes += 1
+            restarts.inc(str(self.index))
+            delay = min(2 ** (self.crashes - 1), 30)
+            logging.error("❌ ВОРКЕР %s УПАЛ (код %s), перезапуск через %s с",
+                          self.index, code, delay)
+            await asyncio.sleep(delay)
+
+    async def stop(self, timeout: float):
+        self._stopping = True
+        if self.alive:
+            try:
+                self.process.terminate()
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logging.error("❌ ВОРКЕР %s НЕ ОСТАНОВИЛСЯ ЗА %s с, kill", self.index, timeout)
+                self.process.kill()
+                await self.process.wait()
+            except ProcessLookupError:
+                pass
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class Supervisor:
+    def __init__(self, workers: int, base_port: int):
+        self.workers = [Worker(i, base_port + i) for i in range(workers)]
+        self.session = None
+        self.forward_headers = {"Content-Type": "application/json"}
+        if WEBHOOK_SECRET:
+            self.forward_headers["X-Telegram-Bot-Api-Secret-Token"] = WEBHOOK_SECRET
+        self.registry = metrics.Registry()
+        self.registry.add(forwarded)
+        self.registry.add(restarts)
+        self.registry.add(metrics.Gauge(
+            "maral_worker_up", "Жив ли процесс воркера",
+            lambda: {str(w.index): int(w.alive) for w in self.workers}, labels=("worker",)))
+
+    def route(self, data: dict) -> Worker:
+        return self.workers[hash(chat_key(data)) % len(self.workers)]
+
+    async def webhook(self, request):
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(text="Forbidden", status=403)
+        body = await request.read()
+        try:
+            data = json_loads(body)
+            worker = self.route(data)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logging.error("❌ ФРОНТ: НЕКОРРЕКТНЫЙ АПДЕЙТ: %s", e)
+            return web.Response(text="Invalid update", status=400)
+        try:
+            async with self.session.post(worker.url + WEBHOOK_PATH, data=body,
+                                         headers=self.forward_headers) as response:
+                text = await response.text()
+                status = response.status
+        except aiohttp.ClientError as e:
+            # воркер перезапускается — Telegram повторит доставку
+            logging.warning("⚠️ ВОРКЕР %s НЕДОСТУПЕН: %s", worker.index, e)
+            text, status = "Worker unavailable", 503
+        forwarded.inc(str(worker.index), str(status))
+        return web.Response(text=text, status=status)
+
+    async def _collect(self, path: str) -> dict:
+        async def fetch(worker):
+            try:
+                async with self.session.get(worker.url + path) as response:
+                    return worker.index, await response.text()
+            except aiohttp.ClientError:
+                return worker.index, None
+        return dict(await asyncio.gather(*(fetch(w) for w in self.workers)))
+
+    async def metrics_handler(self, request):
+        texts = await self._collect("/metrics")
+        body = merge_metrics({str(i): t for i, t in texts.items() if t}) + self.registry.render()
+        return web.Response(text=body, headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    async def stats(self, request):
+        texts = await self._collect("/stats")
+        return web.json_response({
+            str(i): json_loads(t) if t else None for i, t in texts.items()
+        })
+
+    async def export(self, request):
+        """/admin/applications: журнал общий, его отдаёт потоком любой живой воркер."""
+        worker = next((w for w in self.workers if w.alive), None)
+        if worker is None:
+            return web.Response(text="Worker unavailable", status=503)
+        headers = {}
+        if "Authorization" in request.headers:
+            headers["Authorization"] = request.headers["Authorization"]
+        response = None
+        try:
+            # выгрузка может идти дольше общего таймаута сессии
+            async with self.session.get(worker.url + request.path_qs, headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=None)) as upstream:
+                if upstream.status != 200:
+                    return web.Response(body=await upstream.read(), status=upstream.status,
+                                        content_type=upstream.content_type)
+                response = web.StreamResponse(headers={
+                    name: upstream.headers[name]
+                    for name in ("Content-Type", "Content-Disposition") if name in upstream.headers
+                })
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+        except aiohttp.ClientError as e:
+            logging.warning("⚠️ ВЫГРУЗКА ЧЕРЕЗ ВОРКЕР %s ОБОРВАЛАСЬ: %s", worker.index, e)
+            if response is None:
+                return web.Response(text="Worker unavailable", status=503)
+            # заголовки уже ушли — клиент увидит оборванный ответ
+            return response
+
+    async def ping(self, request):
+        return web.Response(text="pong")
+
+    async def ready(self, request):
+        """Готов, когда готов каждый воркер (их /ready отвечает 503 до прогрева)."""
+        texts = await self._collect("/ready")
+        workers = {str(i): json_loads(t) if t else None for i, t in texts.items()}
+        ok = all(w and w.get("stage") == "ready" for w in workers.values())
+        return web.json_response(workers, status=200 if ok else 503)
+
+    async def on_startup(self, app):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        for worker in self.workers:
+            worker.start()
+        logging.info("🧩 СУПЕРВИЗОР: %s воркеров за портом %s", len(self.workers), WEBAPP_PORT)
+
+    async def on_shutdown(self, app):
+        await asyncio.gather(*(w.stop(WORKER_STOP_TIMEOUT) for w in self.workers))
+        await self.session.close()
+        logging.info("🔴 ВОРКЕРЫ ОСТАНОВЛЕНЫ")
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.webhook)
+        app.router.add_get("/ping", self.ping)
+        app.router.add_get("/ready", self.ready)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_get("/metrics", self.metrics_handler)
+        app.router.add_get("/admin/applications", self.export)
+        app.on_startup.append(self.on_startup)
+        app.on_shutdown.append(self.on_shutdown)
+        return app
+
+
+def _with_label(sample: str, label: str) -> str:
+    name, sep, rest = sample.partition("{")
+    if sep:
+        return f"{name}{{{label},{rest}"
+    name, _, value = sample.partition(" ")
+    return f"{name}{{{label}}} {value}"
+
+
+def merge_metrics(texts: dict) -> str:
+    """Склеивает выдачу /metrics воркеров: метка worker у каждого сэмпла,
+    сэмплы одной метрики идут подряд под общими HELP/TYPE."""
+    families = {}
+    for worker, text in texts.items():
+        label = f'worker="{worker}"'
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, [line, None, []])
+            elif line.startswith("# TYPE "):
+                family[1] = line
+            elif line and family is not None:
+                family[2].append(_with_label(line, label))
+    lines = []
+    for help_line, type_line, samples in families.values():
+        lines.append(help_line)
+        if type_line:
+            lines.append(type_line)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    supervisor = Supervisor(WEB_WORKERS, WORKER_BASE_PORT)
+    logging.info("🚀 ЗАПУСК ФРОНТА НА %s:%s", WEBAPP_HOST, WEBAPP_PORT)
+    web.run_app(supervisor.create_app(), host=WEBAPP_HOST, port=WEBAPP_PORT)
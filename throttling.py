@@ -0,0 +1,166 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+import metrics
+
+DEFAULT_GROUP = "default"
+
+
+class Limit(NamedTuple):
+    rate: int           # сколько нажатий
+    window: float       # за сколько секунд
+
+
+def throttle(group: str):
+    """Относит хендлер к группе лимитов (по умолчанию — DEFAULT_GROUP).
+
+    Ставится под декоратором регистрации, как в примерах aiogram:
+
+        @dp.callback_query_handler(...)
+        @throttle("faq")
+        async def show_faq_detail(...): ...
+    """
+    def decorator(handler):
+        handler.throttle_group = group
+        return handler
+    return decorator
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    """«default=30/60,faq=20/60» -> {"default": Limit(30, 60), "faq": Limit(20, 60)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        group, _, value = item.partition("=")
+        rate, _, window = value.partition("/")
+        limits[group.strip()] = Limit(int(rate), float(window or 60))
+    return limits
+
+
+class _Window:
+    """Скользящее окно из двух соседних фиксированных: текущего и прошлого."""
+    __slots__ = ("start", "prev", "cur", "warned")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.prev = 0
+        self.cur = 0
+        self.warned = False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Антифлуд: ограничивает частоту нажатий одного пользователя по группам хендлеров.
+
+    Оценка скользящего окна — прошлый интервал с весом оставшейся доли
+    плюс текущий, на пользователя и группу хранится четыре числа. Записи
+    лежат в OrderedDict в порядке последнего обращения: простаивающие
+    выкидываются с начала при каждом обращении, а общее число ограничено
+    max_entries, так что память не растёт с числом разных пользователей.
+
+    Сверх лимита хендлер не вызывается. Один раз за окно пользователь
+    получает «сәл күтіңіз» (для callback — всплывашкой без нового
+    сообщения), дальше лишние нажатия молча отбрасываются.
+    """
+
+    def __init__(self, limits: Dict[str, Limit], max_entries: int = 100_000,
+                 warning: str = "⏳ Тым жиі басып жатырсыз. Сәл күте тұрыңыз."):
+        super().__init__()
+        self.limits = dict(limits)
+        self.limits.setdefault(DEFAULT_GROUP, Limit(30, 60))
+        self.max_entries = max_entries
+        self.warning = warning
+        self._windows: "OrderedDict[tuple, _Window]" = OrderedDict()
+        # метрики
+        self.blocked = {group: 0 for group in self.limits}
+        self.warnings = 0
+        self.evicted = 0
+        for group in self.limits:
+            metrics.throttled_total.inc(group, value=0)
+
+    def _evict(self, now: float):
+        windows = self._windows
+        while len(windows) > self.max_entries:
+            windows.popitem(last=False)
+            self.evicted += 1
+        # несколько самых давних: если их окна давно прошли, они ничего не помнят
+        for _ in range(4):
+            if not windows:
+                break
+            (_, group), window = next(iter(windows.items()))
+            if now - window.start < 2 * self.limits[group].window:
+                break
+            windows.popitem(last=False)
+            self.evicted += 1
+
+    def hit(self, user_id: int, group: str, now: float = None) -> bool:
+        """Учитывает нажатие; False — лимит превышен."""
+        now = time.monotonic() if now is None else now
+        limit = self.limits.get(group) or self.limits[DEFAULT_GROUP]
+        key = (user_id, group if group in self.limits else DEFAULT_GROUP)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window(now)
+        else:
+            self._windows.move_to_end(key)
+            elapsed = now - window.start
+            if elapsed >= limit.window:
+                # сдвигаем окно на целое число интервалов
+                shifts = int(elapsed // limit.window)
+                window.prev = window.cur if shifts == 1 else 0
+                window.cur = 0
+                window.start += shifts * limit.window
+                window.warned = False
+        self._evict(now)
+
+        weight = 1 - (now - window.start) / limit.window
+        if window.prev * weight + window.cur >= limit.rate:
+            return False
+        window.cur += 1
+        return True
+
+    async def _check(self, user):
+        if user is None:
+            return None
+        handler = current_handler.get()
+        group = getattr(handler, "throttle_group", DEFAULT_GROUP)
+        if self.hit(user.id, group):
+            return None
+        group = group if group in self.limits else DEFAULT_GROUP
+        self.blocked[group] += 1
+        metrics.throttled_total.inc(group)
+        window = self._windows[(user.id, group)]
+        if window.warned:
+            return False
+        window.warned = True
+        self.warnings += 1
+        logging.warning("🚫 ФЛУД: пользователь %s, группа %s", user.id, group)
+        return True
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        warn = await self._check(message.from_user)
+        if warn is None:
+            return
+        if warn:
+            await message.answer(self.warning)
+        raise CancelHandler()
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        warn = await self._check(callback_query.from_user)
+        if warn is None:
+            return
+        # ответ на callback нужен в любом случае, иначе у кнопки крутятся «часики»
+        await callback_query.answer(self.warning if warn else None)
+        raise CancelHandler()
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._windows),
+            "blocked": dict(self.blocked),
+            "warnings": self.warnings,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+
+class UpdateQueue:
+    """Ограниченная очередь апдейтов с очередью на каждый чат.
+
+    Апдейты одного чата лежат в своей FIFO и обрабатываются строго по
+    порядку (важно для шагов RequestForm), разные чаты — параллельно.
+    Одновременно обрабатывается не больше workers апдейтов (семафор на
+    всю очередь), а принятых, но не обработанных — не больше maxsize.
+    Медленный чат держит только свою очередь, а не соседей по шарду.
+    """
+
+    def __init__(self, handler, workers: int = 64, maxsize: int = 1000,
+                 put_timeout: float = 5.0):
+        self._handler = handler
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self.put_timeout = put_timeout
+        self._chats = {}            # ключ чата -> deque апдейтов
+        self._tasks = set()         # задачи, разбирающие очереди чатов
+        self._slots = None
+        self._space = None          # есть место под новый апдейт
+        self._idle = None           # всё принятое обработано
+        self._running = False
+        self.pending = 0            # принято и ещё не обработано
+        self.active = 0             # обрабатывается прямо сейчас
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def start(self):
+        if self._running:
+            return
+        self._slots = asyncio.Semaphore(self.workers)
+        self._space = asyncio.Event()
+        self._space.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._running = True
+        logging.info("🧵 ОЧЕРЕДЬ АПДЕЙТОВ: до %s одновременно, ёмкость %s", self.workers, self.maxsize)
+
+    async def put(self, key, update) -> bool:
+        """Кладёт апдейт в очередь чата.
+
+        Если очередь заполнена — ждёт до put_timeout секунд (backpressure на
+        вебхук), после чего возвращает False.
+        """
+        if self.pending >= self.maxsize:
+            deadline = time.monotonic() + self.put_timeout
+            while self.pending >= self.maxsize:
+                self._space.clear()
+                try:
+                    await asyncio.wait_for(self._space.wait(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    logging.warning("⚠️ ОЧЕРЕДЬ АПДЕЙТОВ ПЕРЕПОЛНЕНА (%s)", self.depth())
+                    return False
+        self.pending += 1
+        self._idle.clear()
+        if self.pending > self.max_depth:
+            self.max_depth = self.pending
+        chat = self._chats.get(key)
+        if chat is not None:
+            chat.append(update)
+        else:
+            self._chats[key] = deque((update,))
+            task = asyncio.create_task(self._drain(key), name=f"update-chat-{key}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return True
+
+    def depth(self) -> int:
+        """Принятые и ещё не обработанные апдейты (в том числе текущие)."""
+        return self.pending
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "capacity": self.maxsize,
+            "depth": self.pending,
+            "active": self.active,
+            "chats": len(self._chats),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def _drain(self, key):
+        """Разбирает очередь одного чата, пока она не опустеет."""
+        chat = self._chats[key]
+        while chat:
+            update = chat[0]
+            try:
+                async with self._slots:
+                    self.active += 1
+                    try:
+                        # отдельная задача = свежая копия контекста: aiogram
+                        # кэширует состояние FSM в contextvars, и без этого
+                        # оно «протекает» между апдейтами
+                        await asyncio.create_task(self._handler(update))
+                        self.processed += 1
+                    finally:
+                        self.active -= 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.error("❌ ОШИБКА ОБРАБОТКИ АПДЕЙТА: %s", e)
+            chat.popleft()
+            self.pending -= 1
+            self._space.set()
+            if not self.pending:
+                self._idle.set()
+        del self._chats[key]
+
+    async def stop(self, timeout: float = 10.0):
+        """Дожидается обработки очереди (не дольше timeout) и гасит задачи."""
+        if not self._running:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("⚠️ ОЧЕРЕДЬ НЕ ОБРАБОТАНА ДО КОНЦА: %s апдейтов", self.depth())
+        self._running = False
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)